@@ -0,0 +1,39 @@
+# control_kernels.py - 制御周期ごとに呼ぶ数値計算カーネル（numbaがあればJITコンパイル）
+import math
+import numpy as np
+from numba_compat import njit
+
+@njit(cache=True, fastmath=True)
+def pure_pursuit(wp_x, wp_y, x, y, yaw, lookahead, wheelbase=0.2):
+    """
+    Pure Pursuit 操舵角計算
+    wp_x, wp_y: ウェイポイント座標配列 [m]
+    x, y, yaw: 車両位置 [m]・方位 [rad]
+    lookahead: 前方注視距離 [m]
+    wheelbase: ホイールベース [m]
+    戻り値: (操舵角 [rad], 目標ウェイポイントのインデックス)
+    """
+    n = wp_x.shape[0]
+    # 最近傍ウェイポイント
+    nearest = np.argmin((wp_x - x) ** 2 + (wp_y - y) ** 2)
+
+    # 最近傍から先で、注視距離以上離れた最初の点を目標にする（なければ最終点）
+    target = n - 1
+    lookahead_sq = lookahead * lookahead
+    for i in range(nearest, n):
+        dx = wp_x[i] - x
+        dy = wp_y[i] - y
+        if dx * dx + dy * dy >= lookahead_sq:
+            target = i
+            break
+
+    dx = wp_x[target] - x
+    dy = wp_y[target] - y
+    ld = math.sqrt(dx * dx + dy * dy)
+    if ld < 1e-6:
+        return 0.0, target
+    alpha = math.atan2(dy, dx) - yaw
+    return math.atan2(2.0 * wheelbase * math.sin(alpha), ld), target
+
+# import時に一度呼んでコンパイル（キャッシュ済みなら読み込みのみ）
+pure_pursuit(np.zeros(2), np.ones(2), 0.0, 0.0, 0.0, 0.5)
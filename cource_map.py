@@ -17,6 +17,11 @@ def world_to_grid(x, y):
     iy = int((y - y_min) / resolution)
     return ix, iy
 
+def world_to_grid_array(points):
+    """ワールド座標配列 (...,2) (m) → グリッド座標配列 (...,2) (col,row)（world_to_gridの一括版）"""
+    pts = np.asarray(points, dtype=np.float64)
+    return ((pts - (x_min, y_min)) / resolution).astype(np.int64)
+
 def grid_to_world(ix, iy):
     """グリッド座標 (col,row) → ワールド座標 (m)"""
     x = ix * resolution + x_min
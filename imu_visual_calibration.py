@@ -107,6 +107,18 @@ class IMUVisualCalibration:
                     bbox=dict(boxstyle="round,pad=0.3", facecolor="yellow", alpha=0.7),
                     fontsize=9)
         
+        # 選択点の表示用（クリックのたびに図形を追加せず、事前に作った図形を更新する）
+        self.cal_markers = self.ax.scatter([], [], c='red', s=150, marker='*', 
+                                           edgecolors='darkred', linewidth=2)
+        self.cal_labels = [
+            self.ax.annotate('', (0, 0), xytext=(10, 10), 
+                             textcoords='offset points',
+                             fontsize=10, fontweight='bold', color='red',
+                             bbox=dict(boxstyle="round,pad=0.3", facecolor="red", alpha=0.2),
+                             visible=False)
+            for _ in range(2)
+        ]
+        
         return True
     
     def highlight_landmark_candidates(self):
@@ -192,13 +204,11 @@ class IMUVisualCalibration:
         })
         
         # 選択点を表示
-        self.ax.scatter(click_x, click_y, c='red', s=150, marker='*', 
-                       edgecolors='darkred', linewidth=2)
-        self.ax.annotate(f'Calibration Point {point_num}', 
-                        (click_x, click_y), xytext=(10, 10), 
-                        textcoords='offset points',
-                        fontsize=10, fontweight='bold', color='red',
-                        bbox=dict(boxstyle="round,pad=0.3", facecolor="red", alpha=0.2))
+        self.cal_markers.set_offsets([(p['x'], p['y']) for p in self.selected_points])
+        label = self.cal_labels[point_num - 1]
+        label.xy = (click_x, click_y)
+        label.set_text(f'Calibration Point {point_num}')
+        label.set_visible(True)
         
         # 2点選択完了時
         if len(self.selected_points) == 2:
@@ -0,0 +1,42 @@
+# json_io.py - JSON読み書きヘルパー（orjsonがあれば使用、なければ標準json）
+import functools
+import os
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
+def loads(data):
+    """JSONバイト列/文字列 → Pythonオブジェクト"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj):
+    """Pythonオブジェクト → JSONバイト列（インデント2、非ASCIIはそのまま）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+def load_file(path):
+    """JSONファイル読み込み（バイナリのまま解析）"""
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+@functools.lru_cache(maxsize=32)
+def _load_file_at(path, mtime):
+    return load_file(path)
+
+def load_file_cached(path):
+    """JSONファイル読み込み（パスと更新時刻が同じなら前回の解析結果を返す、結果は変更しないこと）"""
+    return _load_file_at(path, os.path.getmtime(path))
+
+def dump_file(path, obj):
+    """JSONファイル書き込み"""
+    payload = dumps(obj)
+    with open(path, 'wb') as f:
+        f.write(payload)
+    return payload
@@ -1,14 +1,22 @@
 # main_waypoint_control.py - プラットフォーム対応版
 import time
 import threading
+import collections
 import queue
+import logging
+import logging.handlers
 import numpy as np
 import math
-import json
+import random
+import json_io
 import sys
+import os
+import functools
 import argparse
+import struct
 from narrow_passage_control import is_in_narrow_passage, narrow_passage_control
 from platform_detector import is_raspberry_pi, get_platform_info
+from numba_compat import njit
 
 # コマンドライン引数の解析
 def parse_arguments():
@@ -26,8 +34,7 @@ args = parse_arguments()
 
 # 設定ファイル読み込み
 try:
-    with open(args.config, 'r') as f:
-        config = json.load(f)
+    config = json_io.load_file_cached(args.config)
 except FileNotFoundError:
     print(f"Warning: {args.config} not found, using default settings")
     config = {}
@@ -68,6 +75,8 @@ WAYPOINT_FILE = config.get('waypoints', {}).get('file', 'quarify.json')
 LOOP_DELAY = config.get('system', {}).get('loop_delay', 0.05)
 SAFE_DIST_FRONT = config.get('system', {}).get('safe_dist_front', 5)
 SAFE_DIST_SIDE = config.get('system', {}).get('safe_dist_side', 7)
+ARRIVAL_DIST = 5.0                              # waypoint到達判定距離
+ARRIVAL_DIST_SQ = ARRIVAL_DIST * ARRIVAL_DIST   # 到達判定は距離の2乗で比較（sqrt不要）
 USE_NARROW_PASSAGE = config.get('system', {}).get('use_narrow_passage', True)
 
 # デバッグ・速度制御設定（コマンドライン引数で上書き可能）
@@ -92,134 +101,193 @@ if DEBUG_MODE:
 else:
     print("🏎️ NORMAL MODE: Full speed operation")
 
+# ---- 制御ループ用ロガー（出力は別スレッドで行い、制御スレッドは標準出力で待たない） ----
+log = logging.getLogger('ctrl')
+log.setLevel(logging.DEBUG if DEBUG_MODE else logging.INFO)
+log.propagate = False
+_log_queue = queue.SimpleQueue()
+log.addHandler(logging.handlers.QueueHandler(_log_queue))
+
+@functools.cache
+def start_log_listener():
+    """ログ出力スレッドを開始（初回呼び出し時のみ、それまでの記録はキューに溜まる）"""
+    listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler(sys.stdout))
+    listener.start()
+    return listener
+
 # ---- 車両制御フラグ ----
 running_flag = threading.Event()  # 走行中フラグ
 pause_flag = threading.Event()    # 一時停止フラグ
 
-# ---- 状態送信キュー ----
-status_queue = queue.Queue()
+# ---- 状態送信チャネル ----
+class StatusChannel:
+    """制御ループ → メイン間の状態受け渡し（定期状態は最新のみ保持、イベントは全件保持）"""
+    def __init__(self):
+        self.cv = threading.Condition()
+        self.latest = None                  # 定期状態（古い値は上書きで破棄）
+        self.events = collections.deque()   # 障害物・完了などの取りこぼし不可イベント
+
+    def publish(self, status):
+        with self.cv:
+            self.latest = status
+            self.cv.notify()
+
+    def publish_event(self, event):
+        with self.cv:
+            self.events.append(event)
+            self.cv.notify()
+
+    def wait(self, timeout=None):
+        """新しいイベントまたは状態が届くまで待機し、(イベントリスト, 最新状態) を返す"""
+        with self.cv:
+            self.cv.wait_for(lambda: self.events or self.latest is not None, timeout)
+            events = list(self.events)
+            self.events.clear()
+            latest, self.latest = self.latest, None
+        return events, latest
+
+status_channel = StatusChannel()
+
+# 定期状態は辞書ではなく固定長バイト列で送る
+# (wp_idx:uint32, FR/LH/RH/RLH/RRH:int16 [cm×10], speed:int16 [×10], steer:int16 [×10])
+STATUS_STRUCT = struct.Struct('<Ihhhhhhh')
+STATUS_FIELDS = ('wp_idx', 'FR', 'LH', 'RH', 'RLH', 'RRH', 'speed', 'steer')
+
+def unpack_status(data):
+    """STATUS_STRUCT でパックされた状態を辞書に戻す（表示側で使用）"""
+    idx, *scaled = STATUS_STRUCT.unpack(data)
+    return dict(zip(STATUS_FIELDS, (idx, *(v / 10 for v in scaled))))
 
 # ---- Waypoint読み込み ----
-with open(WAYPOINT_FILE, 'r') as f:
-    waypoints = json.load(f)
+def load_waypoint_arrays(path):
+    """Waypoint JSON（辞書のリスト）→ 並列配列 (x, y, v, yaw, narrow)
+    制御ループで辞書を引かないよう、項目ごとの数値配列に展開する"""
+    wps = json_io.load_file_cached(path)
+    n = len(wps)
+    x = np.fromiter((wp['x'] for wp in wps), dtype=np.float32, count=n)
+    y = np.fromiter((wp['y'] for wp in wps), dtype=np.float32, count=n)
+    v = np.fromiter((wp.get('v', 50) for wp in wps), dtype=np.float32, count=n)           # 指定速度、デフォルト50
+    yaw = np.fromiter((wp.get('yaw', np.nan) for wp in wps), dtype=np.float32, count=n)   # 指定方位角、未指定はNaN
+    narrow = np.fromiter((bool(wp.get('narrow', False)) for wp in wps), dtype=np.bool_, count=n)
+    return x, y, v, yaw, narrow
+
+waypoint_x, waypoint_y, waypoint_v, waypoint_yaw, waypoint_narrow = load_waypoint_arrays(WAYPOINT_FILE)
+n_waypoints = len(waypoint_x)
+
+# 各waypointへの方位[deg]・距離の2乗を一括計算（仮: 現在位置=原点）
+waypoint_bearing = np.degrees(np.arctan2(waypoint_y, waypoint_x))
+waypoint_dist2 = waypoint_x * waypoint_x + waypoint_y * waypoint_y
 
 # ---- 超音波センサスレッド初期化 ----
 class UltrasonicArrayMock:
-    def __init__(self):
-        self.lock = threading.Lock()
-        self.FR = 100
-        self.LH = 100
-        self.RH = 100
-        self.RLH = 100
-        self.RRH = 100
+    def __init__(self, interval=0.009):
+        # (FR, LH, RH, RLH, RRH) をタプルごと差し替える（属性の代入はアトミックなのでロック不要）
+        self._state = (100, 100, 100, 100, 100)
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._update_loop, daemon=True)
+        self._thread.start()
+
+    def _update_loop(self):
+        # 制御周期より十分短い間隔(9ms)で更新し、常に最新値のみを公開（古い値を溜めない）
+        # Event.waitで待機するため、stop()で即座に停止できる
+        while not self._stop_event.wait(self._interval):
+            self.update()
 
     def update(self):
         # 仮の距離をランダムで更新
-        import random
-        with self.lock:
-            self.FR = random.uniform(5, 200)
-            self.LH = random.uniform(5, 200)
-            self.RH = random.uniform(5, 200)
-            self.RLH = random.uniform(5, 200)
-            self.RRH = random.uniform(5, 200)
+        u = random.uniform
+        self._state = (u(5, 200), u(5, 200), u(5, 200), u(5, 200), u(5, 200))
 
     def get_all(self):
-        with self.lock:
-            return self.FR, self.LH, self.RH, self.RLH, self.RRH
+        return self._state
 
-ultra_array = UltrasonicArrayMock()
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
 
-def ultrasonic_loop():
-    while True:
-        ultra_array.update()
-        time.sleep(0.05)  # 50ms
+def make_ultrasonic_source():
+    """超音波センサ取得元を生成（Pi: 実センサ / PC: モック）
+    どちらも生成時に測定スレッドを開始し、get_all() で最新の5距離を (FR, LH, RH, RLH, RRH) の並びで返す"""
+    if PLATFORM_MODE == "raspberry_pi" and ultrasonic_array_thread is not None:
+        return ultrasonic_array_thread.UltrasonicSensors()
+    return UltrasonicArrayMock()
 
-threading.Thread(target=ultrasonic_loop, daemon=True).start()
+@functools.cache
+def get_ultrasonic():
+    """超音波センサ取得（初回呼び出し時に生成、実機ではここでGPIO初期化・測定スレッド開始）"""
+    return make_ultrasonic_source()
 
 # ---- モータドライブ（プラットフォーム別） ----
-if PLATFORM_MODE == "raspberry_pi" and 'PCA9685MotorDriver' in globals():
-    print("Initializing PCA9685 motor driver...")
-    motor = PCA9685MotorDriver(config_file=args.config)
-else:
+class MotorDriveMock:
+    def __init__(self):
+        self.speed = 0
+        self.steer_angle = 0
+
+    def accel(self, duty):
+        self.speed = duty * SPEED_SCALE  # 速度制限適用
+        if DEBUG_MODE:
+            print(f"[Motor Mock] Speed {self.speed:.2f} (scaled from {duty:.2f})")
+
+    def steer(self, duty):
+        self.steer_angle = duty
+        if DEBUG_MODE:
+            print(f"[Motor Mock] Steer {duty:.2f}°")
+
+    def stop(self):
+        self.accel(0)
+        self.steer(0)
+
+@functools.cache
+def get_motor():
+    """モータドライバ取得（初回呼び出し時に初期化）"""
+    if PLATFORM_MODE == "raspberry_pi" and 'PCA9685MotorDriver' in globals():
+        print("Initializing PCA9685 motor driver...")
+        return PCA9685MotorDriver(config_file=args.config)
     print("Using motor mock...")
-    
-    class MotorDriveMock:
-        def __init__(self):
-            self.speed = 0
-            self.steer_angle = 0
-
-        def accel(self, duty):
-            self.speed = duty * SPEED_SCALE  # 速度制限適用
-            if DEBUG_MODE:
-                print(f"[Motor Mock] Speed {self.speed:.2f} (scaled from {duty:.2f})")
-
-        def steer(self, duty):
-            self.steer_angle = duty
-            if DEBUG_MODE:
-                print(f"[Motor Mock] Steer {duty:.2f}°")
-
-        def stop(self):
-            self.accel(0)
-            self.steer(0)
-            
-    motor = MotorDriveMock()
+    return MotorDriveMock()
 
 # ---- IMUセンサー（プラットフォーム別） ----
-if PLATFORM_MODE == "raspberry_pi" and 'BNO055IMUDriver' in globals():
-    print("Initializing BNO055 IMU driver...")
-    imu_sensor = BNO055IMUDriver(config_file=args.config)
-    
-    def get_yaw():
-        return imu_sensor.get_yaw()
+class IMUMock:
+    def __init__(self):
+        self.yaw = 0.0
         
-    def get_sensor_info():
-        return imu_sensor.get_sensor_info()
-else:
-    print("Using IMU mock...")
-    
-    class IMUMock:
-        def __init__(self):
-            self.yaw = 0.0
-            
-        def get_yaw(self):
-            # 仮のヨー角変化をシミュレート
-            import random
-            self.yaw += random.uniform(-0.1, 0.1)
-            return self.yaw
-            
-        def get_sensor_info(self):
-            return {'connected': False, 'is_calibrated': True}
-    
-    imu_mock = IMUMock()
-    
-    def get_yaw():
-        return imu_mock.get_yaw()
+    def get_yaw(self, _u=random.uniform):
+        # 仮のヨー角変化をシミュレート
+        self.yaw += _u(-0.1, 0.1)
+        return self.yaw
         
-    def get_sensor_info():
-        return imu_mock.get_sensor_info()
-
-# IMU 2段階キャリブレーション: BNO055内蔵 + コース環境補正
-print("Setting up IMU calibration system...")
-
-# Stage 1: BNO055内蔵キャリブレーション（センサーレベル）
-if PLATFORM_MODE == "raspberry_pi" and 'imu_sensor' in globals():
-    print("✓ BNO055 hardware calibration active")
+    def get_sensor_info(self):
+        return {'connected': False, 'is_calibrated': True}
+
+@functools.cache
+def get_imu():
+    """IMUセンサー取得（初回呼び出し時に初期化・BNO055内蔵キャリブレーション状態確認）"""
+    # IMU 2段階キャリブレーション: BNO055内蔵 + コース環境補正
+    print("Setting up IMU calibration system...")
     
-    def get_hardware_calibrated_yaw():
-        """BNO055内蔵キャリブレーション済みヨー角"""
-        return imu_sensor.get_yaw()
+    # Stage 1: BNO055内蔵キャリブレーション（センサーレベル）
+    if PLATFORM_MODE == "raspberry_pi" and 'BNO055IMUDriver' in globals():
+        print("Initializing BNO055 IMU driver...")
+        imu = BNO055IMUDriver(config_file=args.config)
+        print("✓ BNO055 hardware calibration active")
         
-    # キャリブレーション状態確認
-    if imu_sensor.is_calibrated():
-        print("✓ BNO055 sensor calibration complete")
+        # キャリブレーション状態確認
+        if imu.is_calibrated():
+            print("✓ BNO055 sensor calibration complete")
+        else:
+            print("⚠ BNO055 sensor calibration in progress...")
     else:
-        print("⚠ BNO055 sensor calibration in progress...")
-else:
-    print("Using mock IMU (BNO055 hardware calibration unavailable)")
+        print("Using IMU mock...")
+        imu = IMUMock()
+        print("Using mock IMU (BNO055 hardware calibration unavailable)")
+    return imu
+
+def get_yaw():
+    return get_imu().get_yaw()
     
-    def get_hardware_calibrated_yaw():
-        """モック環境での基本ヨー角"""
-        return get_yaw()
+def get_sensor_info():
+    return get_imu().get_sensor_info()
 
 # Stage 2: 実走行コース環境補正（マップ表示付き推奨）
 course_calibrator = None
@@ -227,9 +295,6 @@ course_calibrator = None
 # レース用：事前保存されたキャリブレーションファイル読み込み専用
 # 注意: キャリブレーション取得は事前に imu_visual_calibration.py で実行済み
 
-course_offset = 0.0
-calibration_method = "none"
-
 # 優先順位でキャリブレーションファイルを探索・読み込み
 calibration_files = [
     ("imu_custom_calib.json", "custom_user_selection"),  # 最優先：ユーザーカスタム選択
@@ -238,109 +303,96 @@ calibration_files = [
     ("imu_2point_calib.json", "2point")
 ]
 
-for calib_file, method in calibration_files:
-    try:
-        with open(calib_file, 'r') as f:
-            calib_data = json.load(f)
-        
-        # カスタムキャリブレーション形式の処理
-        if method == "custom_user_selection":
-            if 'calibration_result' in calib_data and 'yaw_offset' in calib_data['calibration_result']:
-                course_offset = math.radians(calib_data['calibration_result']['yaw_offset'])
+@functools.cache
+def load_calibration():
+    """コース環境補正キャリブレーション読み込み（初回のみ）-> (course_offset[rad], method, calib_data)"""
+    course_offset = 0.0
+    calibration_method = "none"
+    loaded_data = None
+    
+    # カレントディレクトリを1回だけ走査し、存在するファイルのみ読み込みを試行
+    present_files = {entry.name for entry in os.scandir('.')}
+    
+    for calib_file, method in calibration_files:
+        if calib_file not in present_files:
+            continue
+        try:
+            calib_data = json_io.load_file_cached(calib_file)
+            
+            # カスタムキャリブレーション形式の処理
+            if method == "custom_user_selection":
+                if 'calibration_result' in calib_data and 'yaw_offset' in calib_data['calibration_result']:
+                    course_offset = math.radians(calib_data['calibration_result']['yaw_offset'])
+                else:
+                    print(f"⚠ Invalid custom calibration format in {calib_file}")
+                    continue
             else:
-                print(f"⚠ Invalid custom calibration format in {calib_file}")
-                continue
-        else:
-            # 従来形式の処理
-            course_offset = calib_data.get('offset', 0.0)
-        
-        calibration_method = method
-        
-        print(f"✓ Course calibration loaded: {method.upper().replace('_', ' ')} PRECISION")
-        print(f"  File: {calib_file}")
-        print(f"  Offset: {math.degrees(course_offset):.2f}°")
-        
-        # タイムスタンプ表示
-        if 'calibration_date' in calib_data:
-            print(f"  Date: {calib_data['calibration_date']}")
-        elif 'timestamp' in calib_data:
-            print(f"  Date: {calib_data['timestamp']}")
-        
-        # カスタムキャリブレーション情報
-        if method == "custom_user_selection" and 'usage_instructions' in calib_data:
-            instructions = calib_data['usage_instructions']
-            print(f"  Reference: {instructions.get('reference_heading', 'N/A')}")
-            print(f"  Position: {instructions.get('vehicle_position', 'N/A')}")
-        
-        break
-        
-    except FileNotFoundError:
-        continue
-    except Exception as e:
-        print(f"⚠ Error loading {calib_file}: {e}")
-        continue
+                # 従来形式の処理
+                course_offset = calib_data.get('offset', 0.0)
+            
+            calibration_method = method
+            loaded_data = calib_data
+            
+            print(f"✓ Course calibration loaded: {method.upper().replace('_', ' ')} PRECISION")
+            print(f"  File: {calib_file}")
+            print(f"  Offset: {math.degrees(course_offset):.2f}°")
+            
+            # タイムスタンプ表示
+            if 'calibration_date' in calib_data:
+                print(f"  Date: {calib_data['calibration_date']}")
+            elif 'timestamp' in calib_data:
+                print(f"  Date: {calib_data['timestamp']}")
+            
+            # カスタムキャリブレーション情報
+            if method == "custom_user_selection" and 'usage_instructions' in calib_data:
+                instructions = calib_data['usage_instructions']
+                print(f"  Reference: {instructions.get('reference_heading', 'N/A')}")
+                print(f"  Position: {instructions.get('vehicle_position', 'N/A')}")
+            
+            break
+            
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            print(f"⚠ Error loading {calib_file}: {e}")
+            continue
+    
+    if calibration_method == "none":
+        print("⚠ No course calibration found, using hardware calibration only")
+        print("  Run imu_visual_calibration.py before race to generate calibration")
+    
+    return course_offset, calibration_method, loaded_data
 
-if calibration_method == "none":
-    print("⚠ No course calibration found, using hardware calibration only")
-    print("  Run imu_visual_calibration.py before race to generate calibration")
+_TWO_PI = 2.0 * math.pi
 
 # キャリブレーション適用関数（軽量版）
-def get_course_calibrated_yaw():
-    """段階的キャリブレーション: BNO055内蔵 → コース環境補正"""
-    hardware_yaw = get_hardware_calibrated_yaw()  # Stage 1
-    calibrated = hardware_yaw + course_offset     # Stage 2
+@functools.cache
+def make_calibrated_yaw_reader():
+    """キャリブレーション済みヨー角の取得関数を生成（周期処理ではこの戻り値を保持して呼ぶ）"""
+    course_offset, _, _ = load_calibration()
     
-    # -π to π の範囲に正規化
-    while calibrated > math.pi:
-        calibrated -= 2 * math.pi
-    while calibrated < -math.pi:
-        calibrated += 2 * math.pi
-        
-    return calibrated
-
-# 最終キャリブレーション済みヨー角
-get_calibrated_yaw = get_course_calibrated_yaw
-yaw = get_calibrated_yaw()
-
-if calibration_method != "none":
-    print(f"✓ Race-ready calibration active ({calibration_method}): {math.degrees(yaw):.2f}°")
-else:
-    print(f"○ Hardware calibration only: {math.degrees(yaw):.2f}°")
-
-print(f"Initial Yaw: {math.degrees(yaw):.2f}°")
-
-# ---- 超音波センサスレッド初期化 ----
-class UltrasonicArrayMock:
-    def __init__(self):
-        self.lock = threading.Lock()
-        self.FR = 100
-        self.LH = 100
-        self.RH = 100
-        self.RLH = 100
-        self.RRH = 100
-
-    def update(self):
-        # 仮の距離をランダムで更新
-        import random
-        with self.lock:
-            self.FR = random.uniform(5, 200)
-            self.LH = random.uniform(5, 200)
-            self.RH = random.uniform(5, 200)
-            self.RLH = random.uniform(5, 200)
-            self.RRH = random.uniform(5, 200)
-
-    def get_all(self):
-        with self.lock:
-            return self.FR, self.LH, self.RH, self.RLH, self.RRH
-
-ultra_array = UltrasonicArrayMock()
+    # オフセット等は読み込み後は定数のため、デフォルト引数に束縛してローカル参照にする
+    def read_calibrated_yaw(_raw=get_imu().get_yaw, _off=course_offset, _tau=_TWO_PI, _rem=math.remainder):
+        """段階的キャリブレーション: BNO055内蔵(Stage 1) → コース環境補正(Stage 2)、-π to π に正規化"""
+        return _rem(_raw() + _off, _tau)
+    
+    return read_calibrated_yaw
 
-def ultrasonic_loop():
-    while True:
-        ultra_array.update()
-        time.sleep(0.05)  # 50ms
+def get_calibrated_yaw():
+    """キャリブレーション済みヨー角を取得"""
+    return make_calibrated_yaw_reader()()
 
-threading.Thread(target=ultrasonic_loop, daemon=True).start()
+def report_calibration_status():
+    """キャリブレーション状態と初期ヨー角を表示"""
+    _, calibration_method, _ = load_calibration()
+    yaw = get_calibrated_yaw()
+    
+    if calibration_method != "none":
+        print(f"✓ Race-ready calibration active ({calibration_method}): {math.degrees(yaw):.2f}°")
+    else:
+        print(f"○ Hardware calibration only: {math.degrees(yaw):.2f}°")
+    
+    print(f"Initial Yaw: {math.degrees(yaw):.2f}°")
 
 # ---- オドメトリシステム (モック) ----
 class OdometryMock:
@@ -357,109 +409,116 @@ class OdometryMock:
 
 odom = OdometryMock()
 
-# ---- キャリブレーション済みYaw値取得関数 ----
-def get_current_yaw():
-    """現在のキャリブレーション済みヨー角を取得"""
-    if PLATFORM_MODE == "raspberry_pi" and 'get_calibrated_yaw' in globals():
-        return get_calibrated_yaw()
-    else:
-        return get_yaw()
-
-# 初期Yaw値取得
-current_yaw = get_current_yaw()
-print(f"Current Yaw: {math.degrees(current_yaw):.2f}°")
-
 # ---- Legacy IMUキャリブレーション (オプション) ----
 # （Raspberry Pi実機環境で利用される可能性のある旧システム互換性維持用）
 
+# 狭路の周回別進路（1周目: 左, 2周目: 中央, 3周目: 右, 4周目: 左、以降繰り返し）
+NARROW_PASSAGE_LANES = ("left", "center", "right", "left")
+
+# ---- 制御ループ数値計算部（JITコンパイル対象） ----
+# fastmathはNaNが無い前提で最適化され、yaw欠損（NaN）の判定が消えるため使わない
+@njit(cache=True)
+def _control_step(idx, wp_v, wp_yaw, wp_bearing, wp_dist2, arrival_dist_sq, speed_scale, debug_mode):
+    """目標速度・操舵角・到達判定を計算 -> (target_speed, steer, arrived)"""
+    target_speed = wp_v[idx]
+    
+    # デバッグモード時の速度調整
+    if debug_mode:
+        target_speed = target_speed * speed_scale
+        if target_speed < 10.0:  # 最低速度保証
+            target_speed = 10.0
+    
+    # ウェイポイントにyaw情報があれば使用、なければ（NaN）事前計算した方位
+    steer = wp_yaw[idx]
+    if np.isnan(steer):
+        steer = wp_bearing[idx]
+    
+    # waypoint到達判定（簡易距離閾値、2乗同士で比較）
+    arrived = wp_dist2[idx] < arrival_dist_sq
+    
+    return target_speed, steer, arrived
+
 # ---- メイン制御ループ ----
 def waypoint_control_loop():
     idx = 0
-    n_wp = len(waypoints)
+    start_log_listener()
+    motor = get_motor()
+    n_wp = n_waypoints
     running_flag.wait()  # スタート待ち
     lap = 1  # 1周目からスタート
+    deadline = time.monotonic()  # 周期実行の次回期限（処理時間によるドリフト防止）
+
+    # ループ内で毎回属性を引かないよう、よく使うメソッド・関数をローカルに束縛
+    _accel = motor.accel
+    _steer = motor.steer
+    _get_all = get_ultrasonic().get_all
+    _publish = status_channel.publish
+    _pack = STATUS_STRUCT.pack
+    _publish_event = status_channel.publish_event
+    _sleep = time.sleep
+    _now = time.monotonic
+    _is_paused = pause_flag.is_set
 
     while idx < n_wp:
-        if pause_flag.is_set():
-            motor.accel(0)
-            motor.steer(0)
-            time.sleep(0.05)
+        if _is_paused():
+            _accel(0)
+            _steer(0)
+            _sleep(0.05)
             continue
 
-        # 現在 waypoint
-        wp = waypoints[idx]
-        wp_x, wp_y = wp['x'], wp['y']
-
         # 超音波距離取得
-        FR, LH, RH, RLH, RRH = ultra_array.get_all()
+        FR, LH, RH, RLH, RRH = _get_all()
 
         # 狭路判定・制御
         if USE_NARROW_PASSAGE and is_in_narrow_passage(LH, RH):
-            print("Narrow passage detected!")
-            if wp.get('narrow', False):
+            log.debug("Narrow passage detected!")
+            if waypoint_narrow[idx]:
                 # 周回ごとに進路を選択
-                if lap == 1:
-                    lane = "left"
-                elif lap == 2:
-                    lane = "center"
-                elif lap == 3:
-                    lane = "right"
-                elif lap == 4:
-                    lane = "left"
-                else:
-                    lane = "center"
+                lane = NARROW_PASSAGE_LANES[(lap - 1) % 4]
                 narrow_passage_control(motor, LH, RH, lane=lane)
-                status_queue.put({'event':'narrow_passage', 'wp_idx': idx, 'lane': lane})
-                time.sleep(0.1)
+                _publish_event({'event':'narrow_passage', 'wp_idx': idx, 'lane': lane})
+                _sleep(0.1)
                 continue
 
         # 障害物判定
         if FR < SAFE_DIST_FRONT:
-            motor.accel(-50)
-            motor.steer(0)
-            print("Obstacle Front! Stop/Reverse")
-            status_queue.put({'event':'obstacle_front', 'wp_idx': idx})
-            time.sleep(0.1)
+            _accel(-50)
+            _steer(0)
+            log.debug("Obstacle Front! Stop/Reverse")
+            _publish_event({'event':'obstacle_front', 'wp_idx': idx})
+            _sleep(0.1)
             continue
 
-        # ウェイポイント情報の活用
-        target_speed = wp.get('v', 50)  # ウェイポイント指定速度、デフォルト50
-        target_yaw = wp.get('yaw', 0)   # ウェイポイント指定方位角
-        
-        # デバッグモード時の速度調整
-        if DEBUG_MODE:
-            target_speed = target_speed * SPEED_SCALE
-            if target_speed < 10:  # 最低速度保証
-                target_speed = 10
-        
-        # 進行方向計算（簡易）
-        dx = wp_x - 0  # 仮: 現在位置=0
-        dy = wp_y - 0
-        
-        # ウェイポイントにyaw情報があれば使用、なければ計算
-        if 'yaw' in wp:
-            angle_to_wp = target_yaw
-        else:
-            angle_to_wp = math.degrees(math.atan2(dy, dx))
+        # 目標速度・操舵角・到達判定
+        target_speed, angle_to_wp, arrived = _control_step(
+            idx, waypoint_v, waypoint_yaw, waypoint_bearing, waypoint_dist2,
+            ARRIVAL_DIST_SQ, SPEED_SCALE, DEBUG_MODE)
 
-        motor.accel(target_speed)
-        motor.steer(angle_to_wp)
+        _accel(target_speed)
+        _steer(angle_to_wp)
 
-        # waypoint到達判定（簡易距離閾値）
-        if math.hypot(dx, dy) < 5:
+        # waypoint到達判定
+        if arrived:
             idx += 1
             # 周回数更新
-            if idx % len(waypoints) == 0:
+            if idx % n_wp == 0:
                 lap += 1
 
         # 状態送信
-        status_queue.put({'wp_idx': idx, 'FR':FR, 'LH':LH, 'RH':RH, 'RLH':RLH, 'RRH':RRH, 'speed':motor.speed, 'steer':motor.steer_angle})
-        time.sleep(LOOP_DELAY)
+        _publish(_pack(idx, int(FR * 10), int(LH * 10), int(RH * 10), int(RLH * 10), int(RRH * 10),
+                       int(motor.speed * 10), int(motor.steer_angle * 10)))
+        deadline += LOOP_DELAY
+        slack = deadline - _now()
+        if slack > 0:
+            _sleep(slack)
+        else:
+            # 期限超過（一時停止・障害物回避などの後）は現在時刻から再スタート
+            deadline = _now()
 
     motor.accel(0)
     motor.steer(0)
     print("Waypoint traversal complete")
-    status_queue.put({'event':'complete'})
+    status_channel.publish_event({'event':'complete'})
 
 # ---- スタート・ストップ・復帰コマンド ----
 def start():
@@ -470,6 +529,7 @@ def start():
 def stop():
     print("Stop command received")
     pause_flag.set()
+    motor = get_motor()
     motor.accel(0)
     motor.steer(0)
 
@@ -479,6 +539,12 @@ def resume():
 
 # ---- メイン ----
 if __name__ == '__main__':
+    # ハードウェア初期化・キャリブレーション読み込み（import時には実行しない）
+    start_log_listener()
+    get_ultrasonic()
+    motor = get_motor()
+    report_calibration_status()
+    
     threading.Thread(target=waypoint_control_loop, daemon=True).start()
     print("Press Enter to START")
     input()
@@ -486,13 +552,16 @@ if __name__ == '__main__':
 
     try:
         while True:
-            # 状態モニタ表示
-            while not status_queue.empty():
-                s = status_queue.get()
+            # 状態モニタ表示（新しい状態が届くまでブロッキング待機、古い状態は読み飛ばし）
+            events, latest = status_channel.wait(timeout=1.0)
+            for s in events:
                 print(f"Current Waypoint: {s.get('wp_idx', '-')}, Status: {s}")
-            time.sleep(0.1)
+            if latest is not None:
+                status = unpack_status(latest)
+                print(f"Current Waypoint: {status['wp_idx']}, Status: {status}")
 
     except KeyboardInterrupt:
         print("Emergency stop")
-        motor.accel(0)
-        motor.steer(0)
+        motor.stop()
+        if hasattr(motor, 'cleanup'):
+            motor.cleanup()
@@ -3,11 +3,15 @@
 """
 統合メインシステム - 走行モード選択 → IMUキャリブレーション → レース実行
 """
-import json
+import json_io
 import time
+import math
 import os
 import sys
+import threading
 from datetime import datetime
+import numpy as np
+from control_kernels import pure_pursuit
 
 # IMUキャリブレーションシステムをインポート
 try:
@@ -17,8 +21,37 @@ except ImportError:
     CALIBRATION_AVAILABLE = False
     print("⚠️ Warning: IMU calibration system not available")
 
+CONTROL_PERIOD = 0.1  # 制御周期[s]（10Hz）
+LOOKAHEAD_DIST = 0.5  # Pure Pursuit 前方注視距離[m]
+
+# 画面クリア用ANSIエスケープ（Windows 10以降は一度だけVT処理を有効化）
+CLEAR_SCREEN = "\x1b[2J\x1b[H"
+if os.name == 'nt':
+    os.system('')
+
+# 1行監視表示の出力先（エンコード済みバイト列をバッファへ直接書き込む、バッファがなければテキストで出力）
+_STDOUT_BUFFER = getattr(sys.stdout, 'buffer', None)
+_STDOUT_ENCODING = sys.stdout.encoding or 'utf-8'
+
+# モックセンサー値の範囲（列順: yaw, FL, FR, BL, BR, speed, steer, battery, cpu）
+MOCK_SENSOR_LOW = np.array([0, 0.5, 0.5, 0.5, 0.5, 50, -30, 70, 20], dtype=float)
+MOCK_SENSOR_HIGH = np.array([360, 3.0, 3.0, 3.0, 3.0, 120, 30, 100, 60], dtype=float)
+
 class RaceMonitor:
     """レース中のリアルタイム監視システム"""
+    # 1行監視表示のテンプレート（race_data のキーをそのまま参照、定義時に1回だけ作成）
+    _LINE_FMT = (
+        "\r🏁 {mode} | "
+        "T:{race_time:6.1f}s | "
+        "WP:{wp1:3d}/{total_waypoints:3d} | "
+        "IMU:{imu_yaw:6.1f}° | "
+        "Speed:{vehicle_speed:6.1f} | "
+        "Steer:{steering_angle:+5.1f}° | "
+        "Dist:{distance_to_waypoint:5.2f}m | "
+        "US: FL:{ultrasonic_distances[FL]:4.1f} FR:{ultrasonic_distances[FR]:4.1f} | "
+        "Bat:{battery_level:5.1f}%"
+    ).format
+
     def __init__(self):
         # 監視データ
         self.race_data = {
@@ -36,6 +69,25 @@ class RaceMonitor:
             'battery_level': 100.0,
             'cpu_usage': 0.0
         }
+        # 入れ子の辞書は作り直さず、値だけ書き換える
+        self._us = self.race_data['ultrasonic_distances']
+        self._cur_wp = self.race_data['current_waypoint']
+        self._next_wp = self.race_data['next_waypoint']
+        # ウェイポイント配列（ワールド座標[m]変換済み x, y と v, yaw）
+        self.wp_xw = self.wp_yw = self.wp_v = self.wp_yaw = np.empty(0)
+        self._segd = []
+        
+        # 表示スレッド制御（制御ループは race_data を書くだけで、表示は別スレッドで行う）
+        self._display_stop = threading.Event()
+        self._detail_request = threading.Event()  # 詳細表示の要求（表示スレッド側で処理）
+        self._display_thread = None
+        
+    def set_waypoint_arrays(self, wp_xw, wp_yw, wp_v, wp_yaw):
+        """変換済みウェイポイント配列を設定"""
+        self.wp_xw, self.wp_yw, self.wp_v, self.wp_yaw = wp_xw, wp_yw, wp_v, wp_yaw
+        # 区間長 segd[i] = ウェイポイントi → i+1 の距離を一括計算（最終点は次がないので0）
+        seg_d = np.hypot(np.diff(wp_xw), np.diff(wp_yw))
+        self._segd = np.concatenate((seg_d, [0.0])).tolist()
         
     def update_imu_data(self, yaw, offset=0.0):
         """IMUデータ更新"""
@@ -44,39 +96,43 @@ class RaceMonitor:
         
     def update_ultrasonic_data(self, fl, fr, bl, br):
         """超音波センサーデータ更新"""
-        self.race_data['ultrasonic_distances'] = {
-            'FL': fl, 'FR': fr, 'BL': bl, 'BR': br
-        }
-        
-    def update_waypoint_data(self, current_index, waypoints, current_pos=(0.0, 0.0)):
-        """ウェイポイントデータ更新"""
+        us = self._us
+        us['FL'] = fl
+        us['FR'] = fr
+        us['BL'] = bl
+        us['BR'] = br
+        
+    def update_waypoint_data(self, current_index, current_pos=None):
+        """ウェイポイントデータ更新（set_waypoint_arraysで設定した配列を参照）
+        current_pos=None の場合は仮想現在地（ウェイポイントi自身）として、事前計算済みの区間長 segd[i]
+        （i → i+1、次に向かう区間の長さ）を距離として表示"""
+        n = len(self.wp_xw)
         self.race_data['current_waypoint_index'] = current_index
-        self.race_data['total_waypoints'] = len(waypoints)
-        
-        if 0 <= current_index < len(waypoints):
-            wp = waypoints[current_index]
-            self.race_data['current_waypoint'] = {
-                'x': wp.get('x', 0) * 0.05 - 3.2,
-                'y': wp.get('y', 0) * 0.05 - 1.5,
-                'v': wp.get('v', 100),
-                'yaw': wp.get('yaw', 0)
-            }
+        self.race_data['total_waypoints'] = n
+        
+        if 0 <= current_index < n:
+            x = self.wp_xw[current_index]
+            y = self.wp_yw[current_index]
+            cur = self._cur_wp
+            cur['x'] = x
+            cur['y'] = y
+            cur['v'] = self.wp_v[current_index]
+            cur['yaw'] = self.wp_yaw[current_index]
             
-            # 現在位置からの距離計算
-            dx = self.race_data['current_waypoint']['x'] - current_pos[0]
-            dy = self.race_data['current_waypoint']['y'] - current_pos[1]
-            self.race_data['distance_to_waypoint'] = (dx**2 + dy**2)**0.5
+            # 現在位置からの距離
+            if current_pos is None:
+                self.race_data['distance_to_waypoint'] = self._segd[current_index]
+            else:
+                self.race_data['distance_to_waypoint'] = math.hypot(x - current_pos[0], y - current_pos[1])
         
         # 次のウェイポイント
         next_index = current_index + 1
-        if next_index < len(waypoints):
-            wp_next = waypoints[next_index]
-            self.race_data['next_waypoint'] = {
-                'x': wp_next.get('x', 0) * 0.05 - 3.2,
-                'y': wp_next.get('y', 0) * 0.05 - 1.5,
-                'v': wp_next.get('v', 100),
-                'yaw': wp_next.get('yaw', 0)
-            }
+        if next_index < n:
+            nxt = self._next_wp
+            nxt['x'] = self.wp_xw[next_index]
+            nxt['y'] = self.wp_yw[next_index]
+            nxt['v'] = self.wp_v[next_index]
+            nxt['yaw'] = self.wp_yaw[next_index]
             
     def update_vehicle_data(self, speed, steering_angle):
         """車両データ更新"""
@@ -93,28 +149,55 @@ class RaceMonitor:
         """コンパクトな1行監視表示"""
         data = self.race_data
         
-        # フォーマット済み表示文字列作成
-        monitor_line = (
-            f"🏁 {mode_name} | "
-            f"T:{data['race_time']:6.1f}s | "
-            f"WP:{data['current_waypoint_index']+1:3d}/{data['total_waypoints']:3d} | "
-            f"IMU:{data['imu_yaw']:6.1f}° | "
-            f"Speed:{data['vehicle_speed']:6.1f} | "
-            f"Steer:{data['steering_angle']:+5.1f}° | "
-            f"Dist:{data['distance_to_waypoint']:5.2f}m | "
-            f"US: FL:{data['ultrasonic_distances']['FL']:4.1f} FR:{data['ultrasonic_distances']['FR']:4.1f} | "
-            f"Bat:{data['battery_level']:5.1f}%"
-        )
+        line = self._LINE_FMT(mode=mode_name, wp1=data['current_waypoint_index'] + 1, **data)
         
         # 画面クリア＋表示（同じ行を更新）
-        print(f"\r{monitor_line}", end="", flush=True)
+        if _STDOUT_BUFFER is not None:
+            # print()等でテキスト層に溜まっている出力を先に流す（パイプ出力時の順序入れ替わり防止）
+            sys.stdout.flush()
+            _STDOUT_BUFFER.write(line.encode(_STDOUT_ENCODING, 'replace'))
+            _STDOUT_BUFFER.flush()
+        else:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+        
+    def start_display(self, mode_name="Unknown", interval=0.1):
+        """1行監視表示を一定間隔で更新するバックグラウンドスレッドを開始"""
+        self._display_stop.clear()
+        self._display_thread = threading.Thread(
+            target=self._display_loop, args=(mode_name, interval), daemon=True)
+        self._display_thread.start()
+        
+    def stop_display(self):
+        """表示スレッド停止"""
+        self._display_stop.set()
+        if self._display_thread is not None:
+            self._display_thread.join()
+            self._display_thread = None
+        
+    def request_detailed_monitor(self):
+        """詳細表示を要求（制御ループを止めずに表示スレッドで表示）"""
+        self._detail_request.set()
+        
+    def _display_loop(self, mode_name, interval, detail_hold=2.0):
+        while not self._display_stop.wait(interval):
+            if self._detail_request.is_set():
+                self._detail_request.clear()
+                print()  # 改行
+                self.display_detailed_monitor(mode_name)
+                # 詳細表示中（detail_hold秒）は1行表示を止める
+                if self._display_stop.wait(detail_hold):
+                    break
+                continue
+            self.display_monitor_line(mode_name)
         
     def display_detailed_monitor(self, mode_name="Unknown"):
         """詳細監視表示"""
         data = self.race_data
         
-        # 画面クリア（Windows対応）
-        os.system('cls' if os.name == 'nt' else 'clear')
+        # 画面クリア（シェルを起動せずエスケープシーケンスで消去）
+        sys.stdout.write(CLEAR_SCREEN)
+        sys.stdout.flush()
         
         print("🏁 RACE MONITORING DASHBOARD")
         print("="*80)
@@ -133,33 +216,34 @@ class RaceMonitor:
         print(f"BL: {data['ultrasonic_distances']['BL']:4.1f}m  BR: {data['ultrasonic_distances']['BR']:4.1f}m     Speed: {data['next_waypoint']['v']:6.1f}          CPU: {data['cpu_usage']:5.1f}%")
         print("="*80)
         
-    def mock_sensor_update(self):
-        """センサーデータのモック更新（テスト用）"""
-        import random
+    def prepare_mock_sensors(self, count):
+        """モックセンサー値をレース全体分まとめて生成（テスト用）"""
+        rng = np.random.default_rng()
+        self._mock = rng.uniform(MOCK_SENSOR_LOW, MOCK_SENSOR_HIGH, size=(count, len(MOCK_SENSOR_LOW)))
+
+    def mock_sensor_update(self, i):
+        """センサーデータのモック更新（テスト用、prepare_mock_sensorsで生成したi行目を使用）"""
+        yaw, fl, fr, bl, br, speed, steer, battery, cpu = self._mock[i].tolist()
+        data = self.race_data
         
         # モックIMUデータ
-        self.update_imu_data(random.uniform(0, 360), self.race_data['imu_offset'])
+        data['imu_yaw'] = yaw
         
         # モック超音波データ
-        self.update_ultrasonic_data(
-            random.uniform(0.5, 3.0),
-            random.uniform(0.5, 3.0),
-            random.uniform(0.5, 3.0),
-            random.uniform(0.5, 3.0)
-        )
+        us = self._us
+        us['FL'] = fl
+        us['FR'] = fr
+        us['BL'] = bl
+        us['BR'] = br
         
         # モック車両データ
-        self.update_vehicle_data(
-            random.uniform(50, 120),
-            random.uniform(-30, 30)
-        )
+        data['vehicle_speed'] = speed
+        data['steering_angle'] = steer
         
         # モックシステムデータ
-        self.update_system_data(
-            self.race_data['race_time'] + 0.1,
-            random.uniform(70, 100),
-            random.uniform(20, 60)
-        )
+        data['race_time'] += 0.1
+        data['battery_level'] = battery
+        data['cpu_usage'] = cpu
 
 class MainControlSystem:
     def __init__(self):
@@ -173,6 +257,7 @@ class MainControlSystem:
         
         self.selected_mode = None
         self.waypoints = []
+        self.wp_xw = self.wp_yw = self.wp_v = self.wp_yaw = np.empty(0)
         self.calibration_data = None
         self.imu_offset = 0.0
         
@@ -182,6 +267,7 @@ class MainControlSystem:
         
         # モニタリングシステム
         self.monitor = RaceMonitor()
+        self.debug_detailed = False  # Trueで5秒ごとに詳細表示（デバッグ用）
         
     def display_startup_banner(self):
         """システム起動時のバナー表示"""
@@ -238,8 +324,15 @@ class MainControlSystem:
     def load_waypoints(self, filename):
         """Waypointファイル読み込み"""
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                self.waypoints = json.load(f)
+            self.waypoints = json_io.load_file(filename)
+            
+            # 座標変換済みの配列を一度だけ作成（レース中は辞書を引かない）
+            wps = self.waypoints
+            self.wp_xw = np.array([wp.get('x', 0) for wp in wps], dtype=float) * 0.05 - 3.2
+            self.wp_yw = np.array([wp.get('y', 0) for wp in wps], dtype=float) * 0.05 - 1.5
+            self.wp_v = np.array([wp.get('v', 100) for wp in wps], dtype=float)
+            self.wp_yaw = np.array([wp.get('yaw', 0) for wp in wps], dtype=float)
+            self.monitor.set_waypoint_arrays(self.wp_xw, self.wp_yw, self.wp_v, self.wp_yaw)
             return True
         except Exception as e:
             print(f"❌ Error loading waypoints: {e}")
@@ -285,16 +378,21 @@ class MainControlSystem:
         
         for filename in calibration_files:
             try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    self.calibration_data = json.load(f)
+                # 空ファイルは解析せずに即失敗扱い
+                if os.stat(filename).st_size == 0:
+                    print(f"⚠️ Calibration file is empty: {filename}")
+                    continue
+                
+                self.calibration_data = json_io.load_file(filename)
+                validation = self.calibration_data.get('validation') or {}
                 
-                if self.calibration_data.get('validation', {}).get('is_valid', False):
+                if validation.get('is_valid', False):
                     self.imu_offset = self.calibration_data.get('calculated_offset', 0.0)
                     print(f"✅ Calibration loaded: Offset = {self.imu_offset:.2f}°")
                     self.calibration_completed = True
                     return True
                 else:
-                    print(f"⚠️ Calibration validation failed: {self.calibration_data.get('validation', {}).get('message', 'Unknown error')}")
+                    print(f"⚠️ Calibration validation failed: {validation.get('message', 'Unknown error')}")
                     
             except FileNotFoundError:
                 continue
@@ -377,49 +475,65 @@ class MainControlSystem:
         
         race_start_time = time.time()
         mode_name = self.DRIVING_MODES[self.selected_mode]['name']
+        n_wp = len(self.waypoints)
+        
+        # ループ内で毎回属性を引かないよう、よく使うオブジェクト・メソッドをローカルに束縛
+        monitor = self.monitor
+        race_data = monitor.race_data
+        update_wp = monitor.update_waypoint_data
+        update_sys = monitor.update_system_data
+        mock_update = monitor.mock_sensor_update
+        wp_xw, wp_yw = self.wp_xw, self.wp_yw
+        imu_offset = self.imu_offset
+        perf_counter = time.perf_counter
         
         # モニターシステム初期化
-        self.monitor.update_system_data(0.0)
+        update_sys(0.0)
+        monitor.prepare_mock_sensors(n_wp)
+        monitor.start_display(mode_name)
         
         # レースループ（モニタリング統合版）
+        next_t = time.perf_counter()  # 次周期の絶対期限（処理時間による周期ずれを防ぐ）
         try:
-            for i, waypoint in enumerate(self.waypoints):
+            for i in range(n_wp):
                 elapsed = time.time() - race_start_time
                 
                 # 現在位置（仮想位置 - 実際にはGPS/オドメトリから取得）
-                current_pos = (
-                    waypoint.get('x', 0) * 0.05 - 3.2,  # 仮想現在地
-                    waypoint.get('y', 0) * 0.05 - 1.5
-                )
+                current_pos = (wp_xw[i], wp_yw[i])  # 仮想現在地
                 
-                # モニタリングデータ更新
-                self.monitor.update_waypoint_data(i, self.waypoints, current_pos)
-                self.monitor.update_system_data(elapsed)
+                # モニタリングデータ更新（仮想現在地のため距離は事前計算の区間長 i → i+1 を使用）
+                update_wp(i)
+                update_sys(elapsed)
                 
                 # センサーデータ更新（モック - 実際のセンサーと置き換え）
-                self.monitor.mock_sensor_update()
+                mock_update(i)
                 
                 # IMUオフセット適用
-                self.monitor.race_data['imu_offset'] = self.imu_offset
+                race_data['imu_offset'] = imu_offset
                 
-                # リアルタイム監視表示
-                self.monitor.display_monitor_line(mode_name)
-                
-                # 制御ロジック（ここに実装）
+                # 制御ロジック
                 # - IMU読み取り + オフセット補正
-                # - モーター制御
-                # - 超音波センサー監視
+                yaw = math.radians(race_data['imu_yaw'] + imu_offset)
                 # - Pure Pursuit アルゴリズム
-                # - 障害物回避
-                
-                time.sleep(0.1)  # 制御周期（10Hz）
+                steer, _ = pure_pursuit(wp_xw, wp_yw, current_pos[0], current_pos[1],
+                                        yaw, LOOKAHEAD_DIST)
+                race_data['steering_angle'] = math.degrees(steer)
+                # - モーター制御（ここに実装）
+                # - 超音波センサー監視（ここに実装）
+                # - 障害物回避（ここに実装）
                 
                 # 詳細表示モード切り替え（デバッグ用）
-                # 5秒ごとに詳細表示（オプション）
-                if i % 50 == 0 and i > 0:  # 5秒ごと
-                    print()  # 改行
-                    self.monitor.display_detailed_monitor(mode_name)
-                    time.sleep(2)  # 2秒間詳細表示
+                # 5秒ごとに詳細表示（オプション、表示は表示スレッド側で行い制御ループは待たない）
+                if self.debug_detailed and i % 50 == 0 and i > 0:  # 5秒ごと
+                    monitor.request_detailed_monitor()
+                
+                # 制御周期（10Hz）: 期限まで待機、超過時は現在時刻から再スタート
+                next_t += CONTROL_PERIOD
+                dt = next_t - perf_counter()
+                if dt > 0:
+                    time.sleep(dt)
+                else:
+                    next_t = perf_counter()
                 
         except KeyboardInterrupt:
             print(f"\n🛑 RACE STOPPED (Manual Stop)")
@@ -429,6 +543,7 @@ class MainControlSystem:
             
         finally:
             # レース終了処理
+            self.monitor.stop_display()
             total_time = time.time() - race_start_time
             print(f"\n\n🏁 RACE COMPLETED")
             print("="*80)
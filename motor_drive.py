@@ -38,45 +38,51 @@ class VehicleController:
                 self.pwm.set_pwm(14, 0, PWM_PARAM[0][2])  # ステアリングLEFT
         except FileNotFoundError:
             print(f"Parameter file {self.param_file} not found. Using defaults.")
+        self._build_pwm_lut(PWM_PARAM)
         return PWM_PARAM
 
+    def _build_pwm_lut(self, PWM_PARAM):
+        """
+        Duty(-100~100) → PWM値 の変換表を作成（インデックスは Duty+100）
+        制御周期ごとの乗除算を表引きに置き換える
+        """
+        STEERING_RIGHT_PWM, STEERING_CENTER_PWM, STEERING_LEFT_PWM = PWM_PARAM[0]
+        THROTTLE_FORWARD_PWM, THROTTLE_STOPPED_PWM, THROTTLE_REVERSE_PWM = PWM_PARAM[1]
+
+        self._throttle_lut = [
+            int(THROTTLE_STOPPED_PWM - (THROTTLE_STOPPED_PWM - THROTTLE_FORWARD_PWM)*d/100) if d > 0
+            else int(THROTTLE_STOPPED_PWM + (THROTTLE_REVERSE_PWM - THROTTLE_STOPPED_PWM)*abs(d)/100)
+            for d in range(-100, 101)
+        ]
+        self._steer_lut = [
+            int(STEERING_CENTER_PWM - (STEERING_CENTER_PWM - STEERING_RIGHT_PWM)*d/100) if d >= 0
+            else int(STEERING_CENTER_PWM + (STEERING_LEFT_PWM - STEERING_CENTER_PWM)*abs(d)/100)
+            for d in range(-100, 101)
+        ]
+
     def accel(self, Duty):
         """
         スロットル制御
         Duty: -100~100（負は後退、正は前進）
         """
-        THROTTLE_FORWARD_PWM = self.PWM_PARAM[1][0]
-        THROTTLE_STOPPED_PWM = self.PWM_PARAM[1][1]
-        THROTTLE_REVERSE_PWM = self.PWM_PARAM[1][2]
-
         if Duty > 0:
-            throttle_pwm = int(THROTTLE_STOPPED_PWM - (THROTTLE_STOPPED_PWM - THROTTLE_FORWARD_PWM)*Duty/100)
-            self.pwm.set_pwm(13, 0, throttle_pwm)
+            self.pwm.set_pwm(13, 0, self._throttle_lut[min(int(Duty), 100) + 100])
         elif Duty == 0:
-            self.pwm.set_pwm(13, 0, THROTTLE_STOPPED_PWM)
+            self.pwm.set_pwm(13, 0, self.PWM_PARAM[1][1])
             time.sleep(0.01)
         else:  # Duty < 0
-            self.pwm.set_pwm(13, 0, THROTTLE_REVERSE_PWM)
+            self.pwm.set_pwm(13, 0, self.PWM_PARAM[1][2])
             time.sleep(0.01)
-            self.pwm.set_pwm(13, 0, THROTTLE_STOPPED_PWM)
+            self.pwm.set_pwm(13, 0, self.PWM_PARAM[1][1])
             time.sleep(0.01)
-            throttle_pwm = int(THROTTLE_STOPPED_PWM + (THROTTLE_REVERSE_PWM - THROTTLE_STOPPED_PWM)*abs(Duty)/100)
-            self.pwm.set_pwm(13, 0, throttle_pwm)
+            self.pwm.set_pwm(13, 0, self._throttle_lut[max(int(Duty), -100) + 100])
 
     def steer(self, Duty):
         """
         ステアリング制御
         Duty: -100~100（負は左、正は右）
         """
-        STEERING_RIGHT_PWM  = self.PWM_PARAM[0][0]
-        STEERING_CENTER_PWM = self.PWM_PARAM[0][1]
-        STEERING_LEFT_PWM   = self.PWM_PARAM[0][2]
-
-        if Duty >= 0:
-            steer_pwm = int(STEERING_CENTER_PWM - (STEERING_CENTER_PWM - STEERING_RIGHT_PWM)*Duty/100)
-        else:
-            steer_pwm = int(STEERING_CENTER_PWM + (STEERING_LEFT_PWM - STEERING_CENTER_PWM)*abs(Duty)/100)
-        self.pwm.set_pwm(14, 0, steer_pwm)
+        self.pwm.set_pwm(14, 0, self._steer_lut[max(-100, min(int(Duty), 100)) + 100])
 
 # --- PC上テスト ---
 if __name__ == "__main__":
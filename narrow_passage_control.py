@@ -1,5 +1,10 @@
 # 狭路判定・制御モジュール
+from numba_compat import njit
 
+# レーン名 → レーンID（JIT関数内で文字列比較をしないよう整数で渡す）
+LANE_IDS = {"left": 0, "center": 1, "right": 2}
+
+@njit(cache=True, inline='always')
 def is_in_narrow_passage(LH, RH, threshold=20):
     """
     LH, RH: 左右超音波距離[cm]
@@ -7,24 +12,26 @@ def is_in_narrow_passage(LH, RH, threshold=20):
     """
     return LH < threshold and RH < threshold
 
+@njit(cache=True)
+def _compute_steer(LH, RH, lane_id):
+    """
+    狭路時の操舵量計算
+    lane_id: 0=左レーン（左壁に寄せる）, 1=中央, 2=右レーン（右壁に寄せる）
+    """
+    base = (RH - LH) * 2.0
+    if lane_id == 0:
+        return base - 10.0
+    if lane_id == 2:
+        return base + 10.0
+    return base
+
 def narrow_passage_control(motor, LH, RH, lane="left", base_speed=30):
     """
     狭路通過時の制御
     motor: モータ制御インスタンス
     LH, RH: 左右超音波距離[cm]
-    lane: "left", "center", "right" いずれか
+    lane: "left", "center", "right" いずれか（それ以外は中央扱い）
     base_speed: 狭路時の速度
     """
     motor.accel(base_speed)
-    if lane == "left":
-        # 左レーン：左壁に寄せる
-        steer_correction = (RH - LH) * 2 - 10
-    elif lane == "center":
-        # 中央レーン：左右均等
-        steer_correction = (RH - LH) * 2
-    elif lane == "right":
-        # 右レーン：右壁に寄せる
-        steer_correction = (RH - LH) * 2 + 10
-    else:
-        steer_correction = (RH - LH) * 2
-    motor.steer(steer_correction)
\ No newline at end of file
+    motor.steer(_compute_steer(LH, RH, LANE_IDS.get(lane, 1)))
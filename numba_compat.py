@@ -0,0 +1,12 @@
+# numba_compat.py - Numba JITヘルパー（numba未インストール時は通常のPython関数として実行）
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """numba.njit互換の何もしないデコレータ（@njit / @njit(...) の両方に対応）"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
@@ -2,22 +2,16 @@
 import matplotlib.pyplot as plt
 from matplotlib.patches import Circle
 import numpy as np
-import threading
-import time
-import json
-from matplotlib.animation import FuncAnimation
-from scipy.interpolate import CubicSpline
+import json_io
 
 from cource_map import grid_matrix, world_to_grid, pylons, start_pos, goal_pos
 
 # --- Waypoints読み込み ---
 WAYPOINT_FILE = "quarify.json"
-with open(WAYPOINT_FILE, "r") as f:
-    waypoints = json.load(f)
+waypoints = json_io.load_file(WAYPOINT_FILE)
 
 # --- 初期化 ---
 current_pos = [0, 0]
-status_text = "Waiting"
 
 # --- Figure設定 ---
 fig, ax = plt.subplots(dpi=120)
@@ -33,28 +27,48 @@ for p in pylons:
     ax.add_patch(circ)
 
 # --- Waypoint座標 ---
-wp_x = [wp["x"] for wp in waypoints]
-wp_y = [wp["y"] for wp in waypoints]
+# 1回の走査で (N, 2) 配列を作り、x, y 列をそのまま使う
+wp_xy = np.array([(wp["x"], wp["y"]) for wp in waypoints], dtype=np.float64)
+wp_x, wp_y = wp_xy[:, 0], wp_xy[:, 1]
 
 # --- Pure Pursuit 補間 ---
-cs_x = CubicSpline(np.arange(len(wp_x)), wp_x)
-cs_y = CubicSpline(np.arange(len(wp_y)), wp_y)
+DENSE_SEGMENT_SQ = 1.0  # 区間長の2乗平均がこれ未満なら密とみなし線形補間で十分
 num_points = len(wp_x) * 20  # 補間点
+wp_idx = np.arange(len(wp_x))
 interp_idx = np.linspace(0, len(wp_x)-1, num=num_points)
-pp_x = cs_x(interp_idx)
-pp_y = cs_y(interp_idx)
+seg = np.diff(wp_xy, axis=0)
+if len(wp_x) < 4 or np.mean(np.einsum('ij,ij->i', seg, seg)) < DENSE_SEGMENT_SQ:
+    # 密なWaypoint（または3次補間できない点数）: 線形補間（scipy不要）
+    pp_x = np.interp(interp_idx, wp_idx, wp_x)
+    pp_y = np.interp(interp_idx, wp_idx, wp_y)
+else:
+    # 疎なWaypoint: (N, 2) 配列に対する1本のパラメトリックスプラインで x, y を同時に補間
+    from scipy.interpolate import make_interp_spline
+    spl = make_interp_spline(wp_idx, wp_xy, k=3)
+    pp = spl(interp_idx)
+    pp_x, pp_y = pp[:, 0], pp[:, 1]
 
 # 補間パス描画
 wp_line, = ax.plot(pp_x, pp_y, "m--", lw=2, label="Pure Pursuit Path")
 wp_points, = ax.plot(wp_x, wp_y, "mo", markersize=6)
 
-# 現在位置描画
-pos_dot, = ax.plot([], [], "ro", markersize=8, label="Current Position")
-status_text_box = ax.text(0.02, -0.1, "", transform=ax.transAxes)
+# 現在位置描画（毎フレーム更新する2つだけをanimatedにし、キャッシュした背景に重ねて再描画）
+# ブリットはAxes領域のみ更新するため、ステータス表示はAxes内に置く
+pos_dot, = ax.plot([], [], "ro", markersize=8, label="Current Position", animated=True)
+status_text_box = ax.text(0.02, 0.02, "", transform=ax.transAxes, animated=True,
+                          bbox=dict(facecolor="white", alpha=0.8, edgecolor="none"))
+
+# --- 背景キャッシュ ---
+# 地図・パイロン・パスは全体再描画時（初回表示・リサイズ）に1回だけラスタライズして保存
+background = [None]
+def on_draw(event):
+    background[0] = fig.canvas.copy_from_bbox(ax.bbox)
+
+fig.canvas.mpl_connect("draw_event", on_draw)
 
 # --- 更新関数 ---
 frame_idx = [0]  # リストでグローバルに扱えるように
-def update(frame):
+def update():
     if frame_idx[0] < len(pp_x):
         current_pos[0] = pp_x[frame_idx[0]]
         current_pos[1] = pp_y[frame_idx[0]]
@@ -64,23 +78,19 @@ def update(frame):
         status = "Finished"
     pos_dot.set_data([current_pos[0]], [current_pos[1]])
     status_text_box.set_text(f"Status: {status}")
-    return pos_dot, status_text_box
-
-# --- 模擬ラズパイ送信スレッド ---
-def mock_raspberrypi_thread():
-    global current_pos, status_text
-    idx = 0
-    while idx < len(waypoints):
-        current_pos[0] = wp_x[idx]
-        current_pos[1] = wp_y[idx]
-        status_text = f"Waypoint {idx+1}/{len(waypoints)}"
-        time.sleep(0.05)  # WP速度に応じて調整
-        idx += 1
-    status_text = "Finished"
 
-threading.Thread(target=mock_raspberrypi_thread, daemon=True).start()
+    # 背景を復元して動く部分だけ描き、Axes領域のみ画面へ転送
+    if background[0] is None:
+        return
+    fig.canvas.restore_region(background[0])
+    ax.draw_artist(pos_dot)
+    ax.draw_artist(status_text_box)
+    fig.canvas.blit(ax.bbox)
+    fig.canvas.flush_events()
 
 # --- アニメーション開始 ---
-ani = FuncAnimation(fig, update, interval=50)  # インターバル 50ms (20fps)
+timer = fig.canvas.new_timer(interval=50)  # インターバル 50ms (20fps)
+timer.add_callback(update)
+timer.start()
 plt.legend()
 plt.show()
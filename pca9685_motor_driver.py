@@ -1,5 +1,10 @@
 # pca9685_motor_driver.py - PCA9685を使用したモーター・サーボ制御
-import json
+import atexit
+import functools
+import os
+import struct
+import threading
+import json_io
 from platform_detector import is_raspberry_pi
 
 # Raspberry Pi環境でのみライブラリをインポート
@@ -16,20 +21,32 @@ if is_raspberry_pi():
 else:
     board = busio = PCA9685 = servo = digitalio = None
 
+# PCA9685 レジスタ（LEDn_ON_L から ON_L, ON_H, OFF_L, OFF_H の4バイト/チャンネル）
+LED0_ON_L = 0x06
+
+@functools.lru_cache(maxsize=8)
+def _load_pca_config(path, mtime):
+    """config.json の pca9685 設定を読み込み、I2Cアドレス(16進文字列)を数値に変換
+    (パス, 更新時刻) が同じなら前回の結果を返す（結果は変更しないこと）"""
+    pca_config = json_io.load_file(path).get('pca9685', {})
+    return pca_config, int(pca_config.get('i2c_address', '0x40'), 16)
+
 class PCA9685MotorDriver:
+    # モーター duty(-100~100) → サーボ角度×10（0~1800）の変換表（インデックスは duty+100）
+    _MOTOR_ANGLE_LUT = tuple(int((90 + d * 0.9) * 10) for d in range(-100, 101))
+    
     def __init__(self, config_file="config.json"):
-        # 設定読み込み
+        # 設定読み込み（同じ設定ファイルはインスタンス間で1回だけ解析）
         try:
-            with open(config_file, 'r') as f:
-                config = json.load(f)
-            self.pca_config = config.get('pca9685', {})
+            self.pca_config, self.i2c_address = _load_pca_config(
+                config_file, os.stat(config_file).st_mtime)
         except Exception as e:
             print(f"Config file error: {e}")
-            self.pca_config = {}
+            self.pca_config, self.i2c_address = {}, 0x40
         
         # 設定値
-        self.i2c_address = int(self.pca_config.get('i2c_address', '0x40'), 16)
         self.frequency = self.pca_config.get('frequency', 50)
+        self.i2c_frequency = self.pca_config.get('i2c_frequency', 400000)
         self.motor_channel = self.pca_config.get('motor_channel', 0)
         self.servo_channel = self.pca_config.get('servo_channel', 1)
         
@@ -44,6 +61,9 @@ class PCA9685MotorDriver:
         # 現在の状態
         self.speed = 0
         self.steer_angle = 0
+        # 最後に書き込んだサーボ角度（0.1度単位）、同じ値の再書き込みを省く
+        self._last_motor_q = None
+        self._last_steer_q = None
         
         # ハードウェア初期化
         self.pca = None
@@ -58,8 +78,9 @@ class PCA9685MotorDriver:
     def _init_hardware(self):
         """PCA9685ハードウェアの初期化"""
         try:
-            # I2C初期化
-            i2c = busio.I2C(board.SCL, board.SDA)
+            # I2C初期化（Fast-mode 400kHz）
+            # Raspberry Piでは /boot/config.txt に dtparam=i2c_arm_baudrate=400000 の設定も必要
+            i2c = busio.I2C(board.SCL, board.SDA, frequency=self.i2c_frequency)
             self.pca = PCA9685(i2c, address=self.i2c_address)
             self.pca.frequency = self.frequency
             
@@ -74,6 +95,12 @@ class PCA9685MotorDriver:
             # 初期位置設定
             self.motor_servo.angle = 90  # ニュートラル
             self.steer_servo.angle = 90  # センター
+            self._last_motor_q = self._last_steer_q = 900
+            
+            # I2C送信スレッド開始
+            self._start_tx_worker()
+            # 異常終了時（Ctrl-C等）もニュートラルを書き込んでから終了する
+            atexit.register(self.cleanup)
             
             print("PCA9685 initialized successfully")
             
@@ -89,14 +116,7 @@ class PCA9685MotorDriver:
         self.speed = max(-100, min(100, duty))  # -100~100に制限
         
         if self.pca is not None:
-            try:
-                # duty値を角度に変換 (-100~100 → 0~180)
-                angle = 90 + (self.speed * 0.9)  # 90±90度
-                angle = max(0, min(180, angle))
-                self.motor_servo.angle = angle
-                print(f"[PCA9685 Motor] Speed {self.speed} → Angle {angle:.1f}°")
-            except Exception as e:
-                print(f"Motor control error: {e}")
+            self._request_write()
         else:
             print(f"[Mock Motor] Speed {self.speed}")
     
@@ -108,28 +128,122 @@ class PCA9685MotorDriver:
         self.steer_angle = max(-90, min(90, duty))  # -90~90に制限
         
         if self.pca is not None:
-            try:
-                # duty値を角度に変換 (-90~90 → 0~180)
-                angle = 90 + self.steer_angle  # 90±90度
-                angle = max(0, min(180, angle))
-                self.steer_servo.angle = angle
-                print(f"[PCA9685 Steer] Angle {self.steer_angle} → Servo {angle:.1f}°")
-            except Exception as e:
-                print(f"Steering control error: {e}")
+            self._request_write()
         else:
             print(f"[Mock Steer] Angle {self.steer_angle}")
     
+    def set_motor_and_steer(self, duty, steer_duty):
+        """
+        モーター速度とステアリングを同時に設定
+        duty: -100 to 100, steer_duty: -90 to 90
+        """
+        self.speed = max(-100, min(100, duty))
+        self.steer_angle = max(-90, min(90, steer_duty))
+        
+        if self.pca is not None:
+            self._request_write()
+        else:
+            print(f"[Mock Motor] Speed {self.speed} / [Mock Steer] Angle {self.steer_angle}")
+    
+    # ---- I2C送信スレッド ----
+    # accel/steer は目標値を更新して送信スレッドを起こすだけで、I2C転送を待たない
+    # 転送中に複数回更新された場合は最新値のみ送信（古い指令は溜めない）
+    # ただしスロットル0（停止）は書き込み完了まで待つ（直後にプロセスが終了しても確実に止める）
+    def _start_tx_worker(self):
+        self._tx_cv = threading.Condition()
+        self._tx_lock = threading.Lock()  # I2C書き込みの排他（値の読み出しもこの中で行う）
+        self._tx_pending = False
+        self._tx_running = True
+        self._tx_thread = threading.Thread(target=self._tx_loop, daemon=True)
+        self._tx_thread.start()
+    
+    def _stop_tx_worker(self):
+        with self._tx_cv:
+            self._tx_running = False
+            self._tx_cv.notify()
+        self._tx_thread.join()
+    
+    def _request_write(self):
+        if self.speed == 0:
+            self._write_latest()
+            return
+        with self._tx_cv:
+            self._tx_pending = True
+            self._tx_cv.notify()
+    
+    def _tx_loop(self):
+        while True:
+            with self._tx_cv:
+                self._tx_cv.wait_for(lambda: self._tx_pending or not self._tx_running)
+                if not self._tx_running:
+                    return
+                self._tx_pending = False
+            self._write_latest()
+    
+    def _write_latest(self):
+        # 書き込みロック内で最新値を読むので、後から書いた側が必ず最新の指令になる
+        with self._tx_lock:
+            self._write_outputs(self.speed, self.steer_angle)
+    
+    def _angle_to_off(self, angle, min_pulse, max_pulse):
+        """サーボ角度(0~180) → 12bit OFFカウント（adafruit_motor.servo と同じ換算）"""
+        min_duty = min_pulse * self.frequency / 1000000 * 0xFFFF
+        max_duty = max_pulse * self.frequency / 1000000 * 0xFFFF
+        duty = int(min_duty + angle / 180 * (max_duty - min_duty))
+        return (duty + 1) >> 4
+    
+    def _write_outputs(self, speed, steer_angle):
+        """
+        モーター・ステアリングをPCA9685へ書き込み
+        モーター・サーボが隣接チャンネルなら、自動インクリメントで1回のI2C書き込みにまとめる
+        """
+        # duty値を角度に変換 (-100~100 → 0~180、90±90度) は変換表で
+        motor_q = self._MOTOR_ANGLE_LUT[round(speed) + 100]
+        # ステアリング (-90~90 → 0~180、制限済みなので範囲外にはならない)
+        steer_servo_angle = 90 + steer_angle
+        steer_q = int(steer_servo_angle * 10)
+        if motor_q == self._last_motor_q and steer_q == self._last_steer_q:
+            return  # 両方とも前回と同じ値ならI2C書き込みを省略
+        try:
+            if abs(self.motor_channel - self.servo_channel) != 1:
+                # 非隣接チャンネルは変化した方だけ個別に書き込み
+                if motor_q != self._last_motor_q:
+                    self.motor_servo.angle = motor_q / 10
+                    self._last_motor_q = motor_q
+                if steer_q != self._last_steer_q:
+                    self.steer_servo.angle = steer_servo_angle
+                    self._last_steer_q = steer_q
+            else:
+                first = min(self.motor_channel, self.servo_channel)
+                buf = bytearray(9)
+                buf[0] = LED0_ON_L + 4 * first
+                struct.pack_into('<HH', buf, 1 + 4 * (self.motor_channel - first), 0,
+                                 self._angle_to_off(motor_q / 10, self.motor_min, self.motor_max))
+                struct.pack_into('<HH', buf, 1 + 4 * (self.servo_channel - first), 0,
+                                 self._angle_to_off(steer_servo_angle, self.servo_min, self.servo_max))
+                # MODE1の自動インクリメントはadafruit_pca9685が周波数設定時に有効化済み
+                with self.pca.i2c_device as i2c:
+                    i2c.write(buf)
+                self._last_motor_q = motor_q
+                self._last_steer_q = steer_q
+            print(f"[PCA9685] Speed {speed} → Angle {motor_q / 10:.1f}° / Steer {steer_angle} → Servo {steer_servo_angle:.1f}°")
+        except Exception as e:
+            print(f"Motor/steering control error: {e}")
+    
     def stop(self):
-        """緊急停止"""
-        self.accel(0)
-        self.steer(0)
+        """緊急停止（I2C書き込み完了まで待つ）"""
+        self.set_motor_and_steer(0, 0)
     
     def cleanup(self):
         """リソースのクリーンアップ"""
         if self.pca is not None:
             try:
-                self.stop()
+                # 送信スレッドを止めてから、停止指令を直接書き込む
+                self._stop_tx_worker()
+                self.speed = self.steer_angle = 0
+                self._write_outputs(0, 0)
                 self.pca.deinit()
+                self.pca = None  # atexitからの2回目の呼び出しは何もしない
                 print("PCA9685 cleaned up")
             except Exception as e:
                 print(f"Cleanup error: {e}")
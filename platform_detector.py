@@ -2,7 +2,10 @@
 import platform
 import sys
 import os
+import functools
 
+# 判定結果は実行中に変わらないため、初回のみ判定してキャッシュする
+@functools.lru_cache(maxsize=1)
 def is_raspberry_pi():
     """Raspberry Piで動作しているかを判定"""
     try:
@@ -13,16 +16,18 @@ def is_raspberry_pi():
     except:
         return False
 
+@functools.lru_cache(maxsize=1)
 def is_windows():
     """Windows環境かを判定"""
     return platform.system() == 'Windows'
 
+@functools.lru_cache(maxsize=1)
 def is_linux():
     """Linux環境かを判定"""
     return platform.system() == 'Linux'
 
-def get_platform_info():
-    """現在のプラットフォーム情報を取得"""
+@functools.lru_cache(maxsize=1)
+def _platform_info():
     info = {
         'system': platform.system(),
         'machine': platform.machine(),
@@ -34,6 +39,10 @@ def get_platform_info():
     }
     return info
 
+def get_platform_info():
+    """現在のプラットフォーム情報を取得（呼び出し側で変更できるようコピーを返す）"""
+    return dict(_platform_info())
+
 def print_platform_info():
     """プラットフォーム情報を表示"""
     info = get_platform_info()
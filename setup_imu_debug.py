@@ -8,27 +8,32 @@ BNO055 IMUデバッグ環境セットアップスクリプト
 import subprocess
 import sys
 import os
+import importlib.util
 
-def install_package(package_name):
-    """パッケージをインストール"""
+def install_package(*package_names):
+    """パッケージをインストール（複数指定時は1回のpip実行でまとめてインストール）"""
+    names = ", ".join(package_names)
     try:
-        print(f"📦 Installing {package_name}...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
-        print(f"✅ {package_name} installed successfully")
+        print(f"📦 Installing {names}...")
+        subprocess.check_call([sys.executable, "-m", "pip", "install", *package_names])
+        print(f"✅ {names} installed successfully")
         return True
     except subprocess.CalledProcessError as e:
-        print(f"❌ Failed to install {package_name}: {e}")
+        print(f"❌ Failed to install {names}: {e}")
         return False
 
 def check_package(package_name):
-    """パッケージのインストール確認"""
+    """パッケージのインストール確認（モジュールを実行せず、存在のみ確認）"""
     try:
-        __import__(package_name)
+        found = importlib.util.find_spec(package_name) is not None
+    except (ImportError, ValueError):
+        # "RPi.GPIO" のように親パッケージ自体がない場合
+        found = False
+    if found:
         print(f"✅ {package_name} is already installed")
-        return True
-    except ImportError:
+    else:
         print(f"⚠️ {package_name} is not installed")
-        return False
+    return found
 
 def setup_imu_debug_environment():
     """IMUデバッグ環境セットアップ"""
@@ -50,18 +55,17 @@ def setup_imu_debug_environment():
     print("📋 Checking required packages...")
     
     # 基本パッケージの確認・インストール
-    for package in packages:
-        if not check_package(package):
-            if not install_package(package):
-                print(f"❌ Setup failed: Could not install {package}")
-                return False
+    missing = [package for package in packages if not check_package(package)]
+    if missing and not install_package(*missing):
+        print(f"❌ Setup failed: Could not install {', '.join(missing)}")
+        return False
     
     # ラズパイ環境の場合の追加パッケージ
     if os.path.exists('/proc/device-tree/model'):
         print("🔍 Raspberry Pi detected, installing additional packages...")
-        for package in raspberry_packages:
-            if not check_package(package):
-                install_package(package)
+        missing = [package for package in raspberry_packages if not check_package(package)]
+        if missing:
+            install_package(*missing)
     
     print("\n🎯 Hardware Configuration Guide")
     print("="*50)
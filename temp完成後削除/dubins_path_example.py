@@ -1,12 +1,20 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
-def circle(center, radius, start_angle, end_angle, n=100):
-    """半径 radius の円弧を生成"""
+def circle(center, radius, start_angle, end_angle, n=100, out=None):
+    """半径 radius の円弧を (n, 2) 配列で生成（out を渡すとその配列に書き込み、確保を省略）"""
+    if out is None:
+        out = np.empty((n, 2), dtype=np.float32)
     angles = np.linspace(start_angle, end_angle, n)
-    x = center[0] + radius * np.cos(angles)
-    y = center[1] + radius * np.sin(angles)
-    return x, y
+    np.cos(angles, out=out[:, 0])
+    np.sin(angles, out=out[:, 1])
+    out *= radius
+    out += center
+    return out
+
+def line(p0, p1, n=50):
+    """p0 → p1 の直線を (n, 2) 配列で生成"""
+    return np.linspace(p0, p1, n, dtype=np.float32)
 
 def dubins_path_example():
     turning_radius = 1.0
@@ -20,20 +28,19 @@ def dubins_path_example():
     # --- 開始円弧（左回転） ---
     # 仮に中心を開始位置の左にとる
     center_start = (x0, y0 + turning_radius)
-    x_arc1, y_arc1 = circle(center_start, turning_radius, -np.pi/2, 0)
+    arc1 = circle(center_start, turning_radius, -np.pi/2, 0)
 
     # --- 直線部分 ---
-    x_line = np.linspace(x_arc1[-1], x1 - turning_radius, 50)
-    y_line = np.linspace(y_arc1[-1], y1 - turning_radius, 50)
+    straight = line(arc1[-1], (x1 - turning_radius, y1 - turning_radius))
 
     # --- 終了円弧（右回転） ---
     center_end = (x1 - turning_radius, y1)
-    x_arc2, y_arc2 = circle(center_end, turning_radius, np.pi, np.pi/2)
+    arc2 = circle(center_end, turning_radius, np.pi, np.pi/2)
 
-    # --- 描画 ---
-    plt.plot(x_arc1, y_arc1, 'r', label='Start Arc')
-    plt.plot(x_line, y_line, 'g', label='Straight')
-    plt.plot(x_arc2, y_arc2, 'b', label='End Arc')
+    # --- 描画（x, y は描画時に列で分割） ---
+    plt.plot(arc1[:, 0], arc1[:, 1], 'r', label='Start Arc')
+    plt.plot(straight[:, 0], straight[:, 1], 'g', label='Straight')
+    plt.plot(arc2[:, 0], arc2[:, 1], 'b', label='End Arc')
     plt.scatter([x0, x1], [y0, y1], c='k', marker='o', label='Start/Goal')
     plt.axis('equal')
     plt.legend()
@@ -4,6 +4,7 @@ from matplotlib.animation import FuncAnimation
 from heapq import heappush, heappop
 from cource_map import grid_matrix, start_pos, goal_pos
 from collections import deque
+from itertools import count
 
 def is_reachable_bfs(grid, start, goal):
     """0=通過可能, 1=障害物 の grid に対して BFS で到達可能か判定"""
@@ -36,34 +37,51 @@ def heuristic(a, b):
 def astar(grid, start, goal):
     print(f"[DEBUG] Start={start}, Goal={goal}")
     h, w = grid.shape
+    # ノードはセル番号 r*w+c の整数で扱う（タプルのハッシュ・比較を避ける）
+    start_k = start[0] * w + start[1]
+    goal_k = goal[0] * w + goal[1]
+    # 経路はノードごとに持たず、親ノードだけ記録してゴール到達時に1回だけ復元
+    came_from = np.full(h * w, -1, dtype=np.int64)
+    # 各セルの最小コスト・探索済みフラグもフラットな配列
+    g_score = np.full(h * w, np.inf, dtype=np.float32)
+    closed = np.zeros(h * w, dtype=bool)
+    g_score[start_k] = 0
+    # ヒープ要素は (f, 挿入順カウンタ, ノード) の整数中心のタプル（同じfは先に入れた順）
+    tie = count()
     open_list = []
-    heappush(open_list, (0+heuristic(start, goal), 0, start, [start]))
-    visited = set()
+    heappush(open_list, (0+heuristic(start, goal), next(tie), start_k))
     iter_count = 0
 
     while open_list:
-        f, g, current, path = heappop(open_list)
+        f, _, k = heappop(open_list)
         iter_count += 1
 
         if iter_count % 50 == 0:
-            print(f"[DEBUG] Iter={iter_count}, current={current}, g={g}, f={f}")
+            print(f"[DEBUG] Iter={iter_count}, current={divmod(k, w)}, g={g_score[k]:.0f}, f={f}")
 
-        if current == goal:
+        if k == goal_k:
             print(f"[DEBUG] Goal reached in {iter_count} iterations")
-            return path
+            path = [k]
+            while k != start_k:
+                k = int(came_from[k])
+                path.append(k)
+            return [divmod(k, w) for k in reversed(path)]
 
-        if current in visited:
+        if closed[k]:
             continue
-        visited.add(current)
+        closed[k] = True
 
-        (r, c) = current
+        g = int(g_score[k])
+        r, c = divmod(k, w)
         for dr, dc in [(1,0),(-1,0),(0,1),(0,-1)]:
             nr, nc = r+dr, c+dc
             if 0 <= nr < h and 0 <= nc < w and grid[nr, nc] == 0:
-                new_pos = (nr, nc)
-                if new_pos not in visited:
-                    new_path = path + [new_pos]
-                    heappush(open_list, (g+1+heuristic(new_pos, goal), g+1, new_pos, new_path))
+                nk = nr * w + nc
+                new_g = g + 1
+                if not closed[nk] and new_g < g_score[nk]:
+                    g_score[nk] = new_g
+                    came_from[nk] = k
+                    heappush(open_list, (new_g+heuristic((nr, nc), goal), next(tie), nk))
 
     print("[DEBUG] A* failed: no path found")
     return None
@@ -1,4 +1,5 @@
 import heapq
+from itertools import count
 import numpy as np
 from cource_map import grid_matrix, start_pos, goal_pos
 from scipy.interpolate import splprep, splev
@@ -6,13 +7,20 @@ from scipy.interpolate import splprep, splev
 # --- 8方向A*探索 ---
 def astar_8dir(grid, start, goal):
     h, w = grid.shape
-    open_set = [(0, start)]
-    came_from = {}
-    g_score = {start: 0}
+    # ノードはセル番号 y*w+x の整数で扱い、親・コスト・探索済みはフラットな配列で保持
+    start_k = start[1] * w + start[0]
+    goal_k = goal[1] * w + goal[0]
+    # ヒープ要素は (f, 挿入順カウンタ, ノード)（同じfは先に入れた順）
+    tie = count()
+    open_set = [(0, next(tie), start_k)]
+    came_from = np.full(h * w, -1, dtype=np.int64)
+    g_score = np.full(h * w, np.inf, dtype=np.float32)
+    closed = np.zeros(h * w, dtype=bool)
+    g_score[start_k] = 0
 
-    def heuristic(a, b):
-        dx = abs(a[0]-b[0])
-        dy = abs(a[1]-b[1])
+    def heuristic(x, y):
+        dx = abs(x-goal[0])
+        dy = abs(y-goal[1])
         return max(dx, dy)  # チェビシェフ距離
 
     directions = [
@@ -22,36 +30,41 @@ def astar_8dir(grid, start, goal):
     move_cost = [1,1,1,1,np.sqrt(2),np.sqrt(2),np.sqrt(2),np.sqrt(2)]
 
     while open_set:
-        _, current = heapq.heappop(open_set)
-        if current == goal:
-            path = []
-            while current in came_from:
-                path.append(current)
-                current = came_from[current]
-            path.append(start)
-            return path[::-1]
+        _, _, k = heapq.heappop(open_set)
+        if k == goal_k:
+            path = [k]
+            while k != start_k:
+                k = int(came_from[k])
+                path.append(k)
+            return [(k % w, k // w) for k in reversed(path)]
 
+        if closed[k]:
+            continue
+        closed[k] = True
+
+        y, x = divmod(k, w)
+        g = g_score[k]
         for (dx, dy), cost in zip(directions, move_cost):
-            neighbor = (current[0]+dx, current[1]+dy)
-            if 0 <= neighbor[0] < w and 0 <= neighbor[1] < h:
-                if grid[neighbor[1], neighbor[0]] != 0:
+            nx, ny = x+dx, y+dy
+            if 0 <= nx < w and 0 <= ny < h:
+                if grid[ny, nx] != 0:
                     continue
-                tentative_g = g_score[current] + cost
-                if neighbor not in g_score or tentative_g < g_score[neighbor]:
-                    g_score[neighbor] = tentative_g
-                    f = tentative_g + heuristic(neighbor, goal)
-                    heapq.heappush(open_set, (f, neighbor))
-                    came_from[neighbor] = current
+                nk = ny * w + nx
+                tentative_g = g + cost
+                if not closed[nk] and tentative_g < g_score[nk]:
+                    g_score[nk] = tentative_g
+                    f = tentative_g + heuristic(nx, ny)
+                    heapq.heappush(open_set, (f, next(tie), nk))
+                    came_from[nk] = k
     return []
 
 # --- スプラインで滑らか経路生成 ---
 def smooth_path(path, num_points=500, s=1.0):
     if not path:
         return []
-    x = [p[0] for p in path]
-    y = [p[1] for p in path]
+    pts = np.asarray(path, dtype=np.float64)  # (N, 2) に一括変換
     # スプライン補間
-    tck, u = splprep([x, y], s=s)
+    tck, u = splprep([pts[:, 0], pts[:, 1]], s=s)
     u_new = np.linspace(0, 1, num_points)
     x_new, y_new = splev(u_new, tck)
     return list(zip(x_new, y_new))
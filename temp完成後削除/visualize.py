@@ -1,3 +1,4 @@
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from matplotlib.patches import Rectangle, Circle
@@ -36,12 +37,14 @@ def animate_path(path):
     line, = ax.plot([], [], "b--", lw=2)
     point, = ax.plot([], [], "ro", markersize=6)
 
+    # 経路座標は最初に1回だけ配列化し、各フレームではスライス（ビュー）を渡す
+    path_xy = np.asarray(path, dtype=np.float64).reshape(-1, 2)
+    xs_arr, ys_arr = path_xy[:, 0], path_xy[:, 1]
+
     def update(i):
-        if i < len(path):
-            xs = [p[0] for p in path[:i+1]]
-            ys = [p[1] for p in path[:i+1]]
-            line.set_data(xs, ys)
-            point.set_data([xs[-1]], [ys[-1]])
+        if i < len(path_xy):
+            line.set_data(xs_arr[:i+1], ys_arr[:i+1])
+            point.set_data(xs_arr[i:i+1], ys_arr[i:i+1])
         return line, point
 
     # intervalを33msにして1.5倍速に
@@ -1,6 +1,25 @@
 # test_custom_calibration.py - カスタムキャリブレーション読み込みテスト
-import json
+import functools
 import math
+import os
+import json_io
+
+@functools.lru_cache(maxsize=8)
+def _load_calib(path, mtime, method):
+    """キャリブレーションファイルの解析結果 (calib_data, offset[rad]) をキャッシュ
+    (パス, 更新時刻) が同じなら再解析しない。カスタム形式が不正なら offset は None"""
+    calib_data = json_io.load_file(path)
+    if method == "custom_user_selection":
+        result = calib_data.get('calibration_result')
+        if not result or 'yaw_offset' not in result:
+            return calib_data, None
+        return calib_data, math.radians(result['yaw_offset'])
+    # 従来形式
+    return calib_data, calib_data.get('offset', 0.0)
+
+def load_calib(path, method):
+    """更新時刻を確認してからキャッシュを参照（ファイルがなければ FileNotFoundError）"""
+    return _load_calib(path, os.stat(path).st_mtime, method)
 
 def test_custom_calibration_loading():
     """カスタムキャリブレーション読み込みテスト"""
@@ -20,16 +39,15 @@ def test_custom_calibration_loading():
     # 読み込み処理テスト
     for calib_file, method in calibration_files:
         try:
-            with open(calib_file, 'r') as f:
-                calib_data = json.load(f)
+            calib_data, offset = load_calib(calib_file, method)
             
             print(f"\n✅ Found calibration file: {calib_file}")
             print(f"   Method: {method}")
             
             # カスタムキャリブレーション形式の処理
             if method == "custom_user_selection":
-                if 'calibration_result' in calib_data and 'yaw_offset' in calib_data['calibration_result']:
-                    course_offset = math.radians(calib_data['calibration_result']['yaw_offset'])
+                if offset is not None:
+                    course_offset = offset
                     print(f"   ✓ Custom calibration format detected")
                     print(f"   Raw yaw offset: {calib_data['calibration_result']['yaw_offset']:.1f}°")
                 else:
@@ -37,7 +55,7 @@ def test_custom_calibration_loading():
                     continue
             else:
                 # 従来形式の処理
-                course_offset = calib_data.get('offset', 0.0)
+                course_offset = offset
                 print(f"   ✓ Standard calibration format")
             
             calibration_method = method
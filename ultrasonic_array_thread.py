@@ -2,6 +2,11 @@ import RPi.GPIO as GPIO
 import time
 import threading
 import math
+from array import array
+
+# 制御ループ側の並び (FR, LH, RH, RLH, RRH) → センサ番号 [前, 左前45, 左90, 右前45, 右90]
+# 左右の壁距離 LH/RH には真横(90度)、RLH/RRHの枠には残りの斜め45度を割り当てる
+CONTROL_ORDER = (0, 2, 4, 1, 3)
 
 class UltrasonicSensors:
     """
@@ -14,61 +19,109 @@ class UltrasonicSensors:
         # GPIOピン設定
         self.trig_pins = [15, 13, 35, 32, 36]  # 前方, 左前45, 左90, 右前45, 右90
         self.echo_pins = [26, 24, 37, 31, 38]
+        # 同時にトリガするセンサのグループ（ビームが隣接して干渉しやすい組は別グループ）
+        # 前方・左90・右90 → 左前45・右前45 の2回で1周
+        self.trigger_groups = ((0, 2, 4), (1, 3))
 
         for t in self.trig_pins:
             GPIO.setup(t, GPIO.OUT, initial=GPIO.LOW)
         for e in self.echo_pins:
             GPIO.setup(e, GPIO.IN)
 
+        # echoの立ち上がり/立ち下がり時刻[ns]をエッジ割り込みで記録（ポーリングしない）
+        self._echo_index = {e: i for i, e in enumerate(self.echo_pins)}
+        self._edge_count = [0] * 5  # トリガ後に来たエッジの数
+        self._rise_ns = [0] * 5
+        self._fall_ns = [0] * 5
+        self._echo_done = [threading.Event() for _ in self.echo_pins]
+        for e in self.echo_pins:
+            GPIO.add_event_detect(e, GPIO.BOTH, callback=self._on_echo_edge)
+
         # 測定結果保存（[前, 左前45, 左90, 右前45, 右90]）
-        self.distances = [0.0] * 5
+        self.distances = array('f', [0.0] * 5)
+        # 全センサ測定完了ごとに公開する最新値（タプルの差し替えのみで読み出し側はロック不要）
+        self._latest = tuple(self.distances)
+        self._latest_control = self._to_control_order(self._latest)
 
         # 測定スレッド制御
         self._stop_event = threading.Event()
         self._thread = threading.Thread(target=self._update_loop, daemon=True)
         self._thread.start()
 
-    def _measure_distance(self, trig, echo, max_distance=200.0):
+    def _on_echo_edge(self, channel):
         """
-        超音波距離測定（単発）
+        echoピンのエッジ割り込み（立ち上がりで開始時刻、立ち下がりで終了時刻を記録）
+        近距離の短いechoではコールバック時点でピンが既にLOWのことがあるので、ピンは読み直さず
+        トリガ後のエッジの順番（1つ目=立ち上がり、2つ目=立ち下がり）で判定する
+        """
+        t = time.monotonic_ns()
+        i = self._echo_index[channel]
+        count = self._edge_count[i]
+        if count == 0:
+            self._rise_ns[i] = t
+        elif count == 1:
+            self._fall_ns[i] = t
+            self._echo_done[i].set()
+        self._edge_count[i] = count + 1
+
+    def _measure_group(self, group, max_distance=200.0, timeout=0.04):
+        """
+        超音波距離測定（グループ内のセンサを同時にトリガし、echoは割り込みで個別に計測）
+        group: センサ番号のタプル
         max_distance: 最大計測距離 [cm]
+        timeout: echo待ちタイムアウト [s]（echo開始待ち20ms + パルス幅20ms 相当）
         """
-        GPIO.output(trig, GPIO.HIGH)
-        time.sleep(0.00001)
-        GPIO.output(trig, GPIO.LOW)
+        for i in group:
+            self._echo_done[i].clear()
+            self._edge_count[i] = 0
+            self._rise_ns[i] = 0
 
-        start_time = time.time()
-        sig_off = None
-        sig_on = None
-
-        # echo LOW待ち
-        while GPIO.input(echo) == GPIO.LOW:
-            sig_off = time.time()
-            if sig_off - start_time > 0.02:  # タイムアウト20ms
-                return max_distance
-
-        # echo HIGH待ち
-        while GPIO.input(echo) == GPIO.HIGH:
-            sig_on = time.time()
-            if sig_on - sig_off > 0.02:  # タイムアウト20ms
-                return max_distance
-
-        if sig_off is None or sig_on is None:
-            return max_distance
-
-        # 距離計算 [cm]
-        distance = (sig_on - sig_off) * 34000 / 2
-        return min(distance, max_distance)
+        for i in group:
+            GPIO.output(self.trig_pins[i], GPIO.HIGH)
+        time.sleep(0.00001)
+        for i in group:
+            GPIO.output(self.trig_pins[i], GPIO.LOW)
+
+        # 各センサの立ち下がりエッジまで共通の期限で待機（待機中はCPUを使わない）
+        deadline = time.monotonic() + timeout
+        results = []
+        for i in group:
+            if not self._echo_done[i].wait(max(0.0, deadline - time.monotonic())):
+                results.append(max_distance)
+                continue
+
+            pulse_ns = self._fall_ns[i] - self._rise_ns[i]
+            if self._rise_ns[i] == 0 or pulse_ns <= 0:
+                results.append(max_distance)
+                continue
+
+            # 距離計算 [cm]（音速 34000cm/s、往復のため1/2）
+            results.append(min(pulse_ns * 34000 / 2 / 1e9, max_distance))
+        return results
+
+    def _measure_distance(self, i, max_distance=200.0, timeout=0.04):
+        """
+        超音波距離測定（単発）
+        i: センサ番号
+        max_distance: 最大計測距離 [cm]
+        """
+        return self._measure_group((i,), max_distance, timeout)[0]
 
     def _update_loop(self):
         """
         バックグラウンド測定ループ
-        5個のセンサを順次測定
+        干渉しないセンサをグループごとに同時測定
         """
         while not self._stop_event.is_set():
-            for i, (t, e) in enumerate(zip(self.trig_pins, self.echo_pins)):
-                self.distances[i] = self._measure_distance(t, e)
-                time.sleep(0.01)  # 隣接センサ干渉防止
+            for group in self.trigger_groups:
+                for i, d in zip(group, self._measure_group(group)):
+                    self.distances[i] = d
+                time.sleep(0.01)  # グループ間の残響干渉防止
+
+            # 1周分の測定結果を最新値として公開（前回値は破棄）
+            latest = tuple(self.distances)
+            self._latest_control = self._to_control_order(latest)
+            self._latest = latest
 
             # 全センサ更新ごとに少し待機
             time.sleep(0.01)
@@ -77,7 +130,31 @@ class UltrasonicSensors:
         """
         最新の5個の距離を返す
         """
-        return self.distances.copy()
+        return self.distances.tolist()
+
+    def read_into(self, out_buf):
+        """
+        最新の5個の距離を呼び出し側のバッファ（長さ5）に書き込む（毎回の確保なし）
+        """
+        out_buf[:] = self.distances
+        return out_buf
+
+    def get_latest(self):
+        """
+        最後に完了した1周分の測定結果（5個の距離タプル）を返す
+        """
+        return self._latest
+
+    @staticmethod
+    def _to_control_order(d):
+        return tuple(d[i] for i in CONTROL_ORDER)
+
+    def get_all(self):
+        """
+        main_control_loop のモックと共通のインターフェース
+        最新の1周分を制御ループの並び (FR, LH, RH, RLH, RRH) で返す
+        """
+        return self._latest_control
 
     def stop(self):
         """
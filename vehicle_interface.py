@@ -1,4 +1,5 @@
 # vehicle_interface.py
+import functools
 import threading
 import time
 import numpy as np
@@ -8,7 +9,9 @@ import numpy as np
 try:
     import RPi.GPIO as GPIO
     import Adafruit_PCA9685
+    GPIO_AVAILABLE = True
 except ImportError:
+    GPIO_AVAILABLE = False
     class GPIO:
         BOARD = None
         OUT = IN = LOW = HIGH = None
@@ -29,46 +32,141 @@ except ImportError:
             def set_pwm_freq(self, freq): pass
             def set_pwm(self, channel, on, off): pass
 
+# pigpio（pigpiodのDMAサンプリングでエッジ時刻をµs単位で記録）があれば超音波計測に使用
+try:
+    import pigpio
+    PIGPIO_AVAILABLE = True
+except ImportError:
+    PIGPIO_AVAILABLE = False
+
+# 40ピンヘッダの物理ピン番号(BOARD) → BCM番号（pigpioはBCM番号で指定）
+BOARD_TO_BCM = {
+    3: 2, 5: 3, 7: 4, 8: 14, 10: 15, 11: 17, 12: 18, 13: 27, 15: 22, 16: 23,
+    18: 24, 19: 10, 21: 9, 22: 25, 23: 11, 24: 8, 26: 7, 27: 0, 28: 1, 29: 5,
+    31: 6, 32: 12, 33: 13, 35: 19, 36: 16, 37: 26, 38: 20, 40: 21
+}
+
 # -------------------------------
 # Ultrasonic Sensor Array
 class UltrasonicArray:
-    def __init__(self, trig_pins, echo_pins, update_interval=0.05):
+    def __init__(self, trig_pins, echo_pins, update_interval=0.05, trigger_groups=None):
         self.trig_pins = trig_pins
         self.echo_pins = echo_pins
         self.n = len(trig_pins)
         self.update_interval = update_interval
-        self.distances = [0.0]*self.n
+        # 同時にトリガするセンサのグループ（ビームが隣接して干渉しやすい組は別グループ、ultrasonic_array_threadと同じ）
+        # 5個 [前, 左前45, 左90, 右前45, 右90] なら 前方・左90・右90 → 左前45・右前45 の2回で1周
+        if trigger_groups is None:
+            trigger_groups = ((0, 2, 4), (1, 3)) if self.n == 5 else tuple((i,) for i in range(self.n))
+        self.trigger_groups = trigger_groups
+        # 距離はfloat32配列（測定スレッドが書き込み、get_distancesでコピーを返す）
+        self.distances = np.zeros(self.n, np.float32)
+        self._rng = np.random.default_rng()  # モック値用（測定スレッドからのみ使用）
+        self._echo_done = [threading.Event() for _ in range(self.n)]
         self.running = False
+        self._pi = None
+        if PIGPIO_AVAILABLE:
+            pi = pigpio.pi()
+            if pi.connected:
+                self._pi = pi
+                self._setup_pigpio()
+            else:
+                print("pigpiod not running, using RPi.GPIO for ultrasonic sensors")
+        if self._pi is None and GPIO_AVAILABLE:
+            self._setup_gpio()
+
+    def _setup_pigpio(self):
+        pi = self._pi
+        self._trig_bcm = [BOARD_TO_BCM[t] for t in self.trig_pins]
+        self._echo_bcm = [BOARD_TO_BCM[e] for e in self.echo_pins]
+        for t in self._trig_bcm:
+            pi.set_mode(t, pigpio.OUTPUT)
+            pi.write(t, 0)
+        for e in self._echo_bcm:
+            pi.set_mode(e, pigpio.INPUT)
+        # echoのエッジ時刻[µs]はpigpiodが記録するので、Python側の応答遅れが計測値に乗らない
+        self._rise_tick = [0] * self.n
+        self._pulse_us = [0] * self.n
+        self._callbacks = [pi.callback(e, pigpio.EITHER_EDGE, functools.partial(self._on_echo_edge, i))
+                           for i, e in enumerate(self._echo_bcm)]
+
+    def _setup_gpio(self):
         GPIO.setmode(GPIO.BOARD)
-        for t in trig_pins:
+        for t in self.trig_pins:
             GPIO.setup(t, GPIO.OUT, initial=GPIO.LOW)
-        for e in echo_pins:
+        for e in self.echo_pins:
             GPIO.setup(e, GPIO.IN)
+        # echoのエッジはピンごとの割り込みコールバックで記録（複数スレッドでwait_for_edgeを同時に使わない）
+        self._echo_index = {e: i for i, e in enumerate(self.echo_pins)}
+        self._edge_count = [0] * self.n
+        self._rise_ns = [0] * self.n
+        self._pulse_ns = [0] * self.n
+        for e in self.echo_pins:
+            GPIO.add_event_detect(e, GPIO.BOTH, callback=self._on_echo_edge_gpio)
+
+    def _on_echo_edge(self, i, gpio, level, tick):
+        # level: 1=立ち上がり, 0=立ち下がり（2=ウォッチドッグは無視）
+        if level == 1:
+            self._rise_tick[i] = tick
+        elif level == 0:
+            self._pulse_us[i] = pigpio.tickDiff(self._rise_tick[i], tick)
+            self._echo_done[i].set()
+
+    def _on_echo_edge_gpio(self, channel):
+        # コールバック時点のピンを読み直すと短いechoでは既にLOWなので、トリガ後のエッジの順番で判定
+        # 1つ目=立ち上がり, 2つ目=立ち下がり
+        t = time.monotonic_ns()
+        i = self._echo_index[channel]
+        count = self._edge_count[i]
+        if count == 0:
+            self._rise_ns[i] = t
+        elif count == 1:
+            self._pulse_ns[i] = t - self._rise_ns[i]
+            self._echo_done[i].set()
+        self._edge_count[i] = count + 1
 
-    def _measure_distance(self, trig, echo):
-        # 実機では超音波送受信
-        # PCモックではランダム値
-        try:
-            GPIO.output(trig, GPIO.HIGH)
+    def _measure_group(self, group, max_distance=200.0, timeout=0.04):
+        """
+        グループ内のセンサを同時にトリガし、echoはエッジのコールバックで個別に計測
+        timeout: echo待ちタイムアウト [s]（echo開始待ち20ms + パルス幅20ms 相当）
+        """
+        if self._pi is None and not GPIO_AVAILABLE:
+            # PCモックではランダム値
+            return self._rng.uniform(10.0, 150.0, len(group))
+
+        for i in group:
+            self._echo_done[i].clear()
+        if self._pi is not None:
+            for i in group:
+                self._pi.gpio_trigger(self._trig_bcm[i], 10, 1)  # 10µsのトリガパルス
+        else:
+            for i in group:
+                self._edge_count[i] = 0
+            for i in group:
+                GPIO.output(self.trig_pins[i], GPIO.HIGH)
             time.sleep(0.00001)
-            GPIO.output(trig, GPIO.LOW)
-            start = time.time()
-            while GPIO.input(echo) == GPIO.LOW:
-                if time.time() - start > 0.02: break
-            t1 = time.time()
-            while GPIO.input(echo) == GPIO.HIGH:
-                if time.time() - t1 > 0.02: break
-            t2 = time.time()
-            d = (t2 - t1) * 34000 / 2
-            return min(d, 200.0)
-        except:
-            # モック値
-            return np.random.uniform(10, 150)
+            for i in group:
+                GPIO.output(self.trig_pins[i], GPIO.LOW)
+
+        # 各センサの立ち下がりエッジまで共通の期限で待機（待機中はCPUを使わない）
+        deadline = time.monotonic() + timeout
+        results = []
+        for i in group:
+            if not self._echo_done[i].wait(max(0.0, deadline - time.monotonic())):
+                results.append(max_distance)
+            elif self._pi is not None:
+                results.append(min(self._pulse_us[i] * 34000 / 2 / 1_000_000, max_distance))
+            else:
+                results.append(min(self._pulse_ns[i] * 34000 / 2 / 1_000_000_000, max_distance))
+        return results
 
     def _update_loop(self):
+        # 干渉しないセンサをグループごとに同時測定（1スレッドで順に回す）
         while self.running:
-            for i in range(self.n):
-                self.distances[i] = self._measure_distance(self.trig_pins[i], self.echo_pins[i])
+            for group in self.trigger_groups:
+                for i, d in zip(group, self._measure_group(group)):
+                    self.distances[i] = d
+                time.sleep(0.01)  # グループ間の残響干渉防止
             time.sleep(self.update_interval)
 
     def start(self):
@@ -80,7 +178,12 @@ class UltrasonicArray:
         self.running = False
         if hasattr(self, 'thread'):
             self.thread.join()
-        GPIO.cleanup()
+        if self._pi is not None:
+            for cb in self._callbacks:
+                cb.cancel()
+            self._pi.stop()
+        else:
+            GPIO.cleanup()
 
     def get_distances(self):
         return self.distances.copy()
@@ -94,14 +197,17 @@ class IMUSensor:
         self.pitch = 0.0
         self.roll = 0.0
         self.running = False
+        # モック用乱数: yaw/pitch/rollを1回の呼び出しでまとめて生成
+        self._rng = np.random.default_rng()
+        self._lo = np.array([-180., -90., -180.])
+        self._hi = np.array([180., 90., 180.])
 
     def _update_loop(self):
         while self.running:
             # 実機ではBNO055から読み出し
             # PCモックではランダム値
-            self.yaw = np.random.uniform(-180, 180)
-            self.pitch = np.random.uniform(-90, 90)
-            self.roll = np.random.uniform(-180, 180)
+            y, p, r = self._rng.uniform(self._lo, self._hi)
+            self.yaw, self.pitch, self.roll = float(y), float(p), float(r)
             time.sleep(self.update_interval)
 
     def start(self):
@@ -125,6 +231,7 @@ class MotorDrive:
         self.pwm.set_pwm_freq(60)
         # PWMパラメータの読み込み（例:キャリブレーションファイル）
         self.PWM_PARAM = self._read_pwm_param()
+        self._build_pwm_lut(self.PWM_PARAM)
         self.throttle_pwm = 0
         self.steer_pwm = 0
 
@@ -133,27 +240,30 @@ class MotorDrive:
         # mock: [steer_right, steer_center, steer_left], [forward, stopped, reverse]
         return ([409, 307, 205],[410, 307, 205])
 
+    def _build_pwm_lut(self, PWM_PARAM):
+        # duty(-100～100) → PWM値 の変換表（インデックスは duty+100）
+        right_pwm, center_pwm, left_pwm = PWM_PARAM[0]
+        forward_pwm, stop_pwm, reverse_pwm = PWM_PARAM[1]
+        self._throttle_lut = [
+            int(stop_pwm - (stop_pwm - forward_pwm) * d / 100) if d > 0
+            else int(stop_pwm + (reverse_pwm - stop_pwm) * abs(d) / 100)
+            for d in range(-100, 101)
+        ]
+        self._steer_lut = [
+            int(center_pwm - (center_pwm - right_pwm) * d / 100) if d > 0
+            else int(center_pwm + (left_pwm - center_pwm) * abs(d) / 100)
+            for d in range(-100, 101)
+        ]
+
     def accel(self, duty):
-        # duty -100～100
-        forward_pwm, stop_pwm, reverse_pwm = self.PWM_PARAM[1]
-        if duty > 0:
-            pwm_val = int(stop_pwm - (stop_pwm - forward_pwm) * duty / 100)
-        elif duty < 0:
-            pwm_val = int(stop_pwm + (reverse_pwm - stop_pwm) * abs(duty) / 100)
-        else:
-            pwm_val = stop_pwm
+        # duty -100～100（範囲外は端の値）
+        pwm_val = self._throttle_lut[max(-100, min(int(duty), 100)) + 100]
         self.throttle_pwm = pwm_val
         self.pwm.set_pwm(13, 0, pwm_val)
 
     def steer(self, duty):
-        # duty -100～100
-        right_pwm, center_pwm, left_pwm = self.PWM_PARAM[0]
-        if duty > 0:
-            pwm_val = int(center_pwm - (center_pwm - right_pwm) * duty / 100)
-        elif duty < 0:
-            pwm_val = int(center_pwm + (left_pwm - center_pwm) * abs(duty) / 100)
-        else:
-            pwm_val = center_pwm
+        # duty -100～100（範囲外は端の値）
+        pwm_val = self._steer_lut[max(-100, min(int(duty), 100)) + 100]
         self.steer_pwm = pwm_val
         self.pwm.set_pwm(14, 0, pwm_val)
 
@@ -183,10 +293,10 @@ class Vehicle:
         self.motor.stop()
 
     def get_sensors(self):
-        distances = self.ultrasonic.get_distances()
+        # 呼び出しごとに新しい辞書を返す（距離は測定スレッドが更新中の配列からリストにコピー）
         yaw, pitch, roll = self.imu.get_orientation()
         return {
-            "ultrasonic": distances,
+            "ultrasonic": self.ultrasonic.distances.tolist(),
             "imu": {"yaw": yaw, "pitch": pitch, "roll": roll}
         }
 
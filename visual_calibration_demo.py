@@ -1,5 +1,5 @@
 # visual_calibration_demo.py - マップ表示キャリブレーションのデモ
-import json
+import json_io
 import matplotlib.pyplot as plt
 import numpy as np
 
@@ -9,38 +9,30 @@ def demo_visual_calibration():
     print("=== Visual Calibration Demo ===")
     
     # quarify.jsonからwaypointデータを読み込み
+    # 座標は読み込み時に一度だけ (N,2) 配列へ変換
     try:
-        with open('quarify.json', 'r') as f:
-            waypoints = json.load(f)
+        waypoints = json_io.load_file('quarify.json')
+        wp_xy = np.array([(wp['x'], wp['y']) for wp in waypoints], dtype=np.float32)
         print(f"✓ Loaded {len(waypoints)} waypoints")
     except Exception as e:
         print(f"Error loading waypoints: {e}")
-        # デモ用のサンプルデータ作成
-        waypoints = []
-        for i in range(50):
-            angle = i * 2 * np.pi / 50
-            waypoints.append({
-                'x': 10 * np.cos(angle),
-                'y': 10 * np.sin(angle)
-            })
+        # デモ用のサンプルデータ作成（半径10mの円）
+        angle = np.arange(50) * 2 * np.pi / 50
+        wp_xy = np.column_stack((10 * np.cos(angle), 10 * np.sin(angle))).astype(np.float32)
         print("Using sample circular course")
     
     # マップ表示
     fig, ax = plt.subplots(figsize=(10, 8))
     fig.suptitle('IMU Visual Calibration Demo\n(Click 2 points to simulate calibration)', fontsize=14)
     
-    # Waypoint座標抽出
-    x_coords = [wp['x'] for wp in waypoints]
-    y_coords = [wp['y'] for wp in waypoints]
-    
     # コース描画
-    ax.plot(x_coords, y_coords, 'b-', linewidth=3, alpha=0.8, label='Course Path')
-    ax.scatter(x_coords[::10], y_coords[::10], c='lightblue', s=30, alpha=0.7, label='Waypoints (every 10th)')
+    ax.plot(wp_xy[:, 0], wp_xy[:, 1], 'b-', linewidth=3, alpha=0.8, label='Course Path')
+    ax.scatter(wp_xy[::10, 0], wp_xy[::10, 1], c='lightblue', s=30, alpha=0.7, label='Waypoints (every 10th)')
     
     # スタート・ゴール
-    ax.scatter(x_coords[0], y_coords[0], c='green', s=150, marker='o', 
+    ax.scatter(wp_xy[0, 0], wp_xy[0, 1], c='green', s=150, marker='o', 
                label='START', edgecolors='darkgreen', linewidth=2)
-    ax.scatter(x_coords[-1], y_coords[-1], c='red', s=150, marker='s', 
+    ax.scatter(wp_xy[-1, 0], wp_xy[-1, 1], c='red', s=150, marker='s', 
                label='GOAL', edgecolors='darkred', linewidth=2)
     
     # 軸設定
@@ -69,6 +61,24 @@ def demo_visual_calibration():
     # クリック処理用変数
     selected_points = []
     
+    # 選択点の表示用（クリックのたびに図形を追加せず、事前に作った図形を更新する）
+    cal_markers = ax.scatter([], [], c='red', s=200, marker='*', 
+                             edgecolors='darkred', linewidth=2)
+    cal_labels = [
+        ax.annotate('', (0, 0), xytext=(10, 10), 
+                    textcoords='offset points',
+                    fontsize=12, fontweight='bold', color='red',
+                    bbox=dict(boxstyle="round,pad=0.3", facecolor="red", alpha=0.3),
+                    visible=False)
+        for _ in range(2)
+    ]
+    
+    # --- 背景キャッシュ ---
+    # 全体再描画時（初回表示・リサイズ）に保存し、クリック時は追加した図形だけを重ねて描画
+    background = [None]
+    def on_draw(event):
+        background[0] = fig.canvas.copy_from_bbox(ax.bbox)
+    
     def on_click(event):
         if event.inaxes != ax or len(selected_points) >= 2:
             return
@@ -78,13 +88,12 @@ def demo_visual_calibration():
         
         # 点を記録・表示
         selected_points.append({'x': x, 'y': y})
-        ax.scatter(x, y, c='red', s=200, marker='*', 
-                  edgecolors='darkred', linewidth=2)
-        ax.annotate(f'Cal Point {point_num}', 
-                   (x, y), xytext=(10, 10), 
-                   textcoords='offset points',
-                   fontsize=12, fontweight='bold', color='red',
-                   bbox=dict(boxstyle="round,pad=0.3", facecolor="red", alpha=0.3))
+        cal_markers.set_offsets([(p['x'], p['y']) for p in selected_points])
+        label = cal_labels[point_num - 1]
+        label.xy = (x, y)
+        label.set_text(f'Cal Point {point_num}')
+        label.set_visible(True)
+        new_artists = [cal_markers, label]
         
         print(f"Selected Point {point_num}: ({x:.1f}, {y:.1f})")
         
@@ -100,8 +109,8 @@ def demo_visual_calibration():
                 angle_deg += 360
             
             # 方向線描画
-            ax.annotate('', xy=(p2['x'], p2['y']), xytext=(p1['x'], p1['y']),
-                       arrowprops=dict(arrowstyle='->', color='red', lw=4))
+            new_artists.append(ax.annotate('', xy=(p2['x'], p2['y']), xytext=(p1['x'], p1['y']),
+                       arrowprops=dict(arrowstyle='->', color='red', lw=4)))
             
             # 角度・距離表示
             mid_x = (p1['x'] + p2['x']) / 2
@@ -109,10 +118,10 @@ def demo_visual_calibration():
             distance = np.sqrt(dx**2 + dy**2)
             
             result_text = f"Angle: {angle_deg:.1f}°\nDistance: {distance:.1f}m"
-            ax.text(mid_x, mid_y, result_text, 
+            new_artists.append(ax.text(mid_x, mid_y, result_text, 
                    fontsize=11, fontweight='bold', color='red',
                    ha='center', va='center',
-                   bbox=dict(boxstyle="round,pad=0.4", facecolor="white", alpha=0.9))
+                   bbox=dict(boxstyle="round,pad=0.4", facecolor="white", alpha=0.9)))
             
             # 結果説明
             calibration_info = (
@@ -125,11 +134,11 @@ def demo_visual_calibration():
                 f"IMU measurement will be compared to {angle_deg:.1f}°"
             )
             
-            ax.text(0.02, 0.02, calibration_info,
+            new_artists.append(ax.text(0.02, 0.02, calibration_info,
                    transform=ax.transAxes,
                    verticalalignment='bottom',
                    bbox=dict(boxstyle="round,pad=0.5", facecolor="lightgreen", alpha=0.8),
-                   fontsize=9, fontweight='bold')
+                   fontsize=9, fontweight='bold'))
             
             print(f"\n=== Calibration Setup Complete ===")
             print(f"Direction: Point 1 → Point 2 = {angle_deg:.1f}°")
@@ -139,9 +148,19 @@ def demo_visual_calibration():
             print(f"3. Measure IMU yaw angle")
             print(f"4. Offset = {angle_deg:.1f}° - measured_angle")
         
-        fig.canvas.draw()
+        # 追加した図形だけを描画（静的なコースは再描画しない）
+        if background[0] is None:
+            fig.canvas.draw_idle()
+            return
+        fig.canvas.restore_region(background[0])
+        for artist in new_artists:
+            ax.draw_artist(artist)
+        fig.canvas.blit(ax.bbox)
+        # 追加した図形を含めて背景を更新（次のクリックで消えないように）
+        background[0] = fig.canvas.copy_from_bbox(ax.bbox)
     
     # イベント接続
+    fig.canvas.mpl_connect('draw_event', on_draw)
     fig.canvas.mpl_connect('button_press_event', on_click)
     
     plt.tight_layout()
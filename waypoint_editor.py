@@ -6,10 +6,10 @@ from matplotlib.widgets import Slider, Button, RadioButtons
 import json
 import math
 import os
-from cource_map import grid_matrix, world_to_grid, grid_to_world, start_pos, goal_pos, obstacles, start_lines, pylons
-from skimage.draw import line
+from cource_map import grid_matrix, world_to_grid, world_to_grid_array, grid_to_world, start_pos, goal_pos, obstacles, start_lines, pylons
 from scipy.interpolate import splprep, splev
 import numpy as np
+from numba_compat import njit
 
 # 文字化け対策
 plt.rcParams['font.family'] = ['DejaVu Sans', 'Arial', 'sans-serif']
@@ -26,13 +26,59 @@ DRIVING_MODES = {
 # --- 現在のモード ---
 current_mode = 'qualifying'  # デフォルトは予選用
 
-# --- モード別 waypoint リスト ---
-waypoints_dict = {mode: [] for mode in DRIVING_MODES.keys()}
-
 # --- 最大 waypoint 数（スライダー範囲固定） ---
 MAX_WAYPOINTS = 200
 DEFAULT_SPEED = 100.0  # 初期速度を 100 に変更
 
+class WaypointArrays:
+    """
+    1モード分のwaypointを項目ごとの配列で保持（x, y: グリッド座標, v: 速度, yaw: 方位[deg]）
+    先頭 n 個が有効。yaw未計算の点は NaN。JSON（辞書のリスト）との変換は保存・読み込み時のみ
+    """
+    def __init__(self, capacity=MAX_WAYPOINTS):
+        self.x = np.zeros(capacity, np.int32)
+        self.y = np.zeros(capacity, np.int32)
+        self.v = np.zeros(capacity)
+        self.yaw = np.full(capacity, np.nan)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def append(self, x, y, v):
+        i = self.n
+        self.x[i], self.y[i], self.v[i], self.yaw[i] = x, y, v, np.nan
+        self.n += 1
+
+    def delete(self, idx):
+        n = self.n
+        for a in (self.x, self.y, self.v, self.yaw):
+            a[idx:n - 1] = a[idx + 1:n]
+        self.n -= 1
+
+    def clear(self):
+        self.n = 0
+
+    def to_list(self):
+        n = self.n
+        out = [{"x": x, "y": y, "v": v}
+               for x, y, v in zip(self.x[:n].tolist(), self.y[:n].tolist(), self.v[:n].tolist())]
+        for wp, yaw in zip(out, self.yaw[:n].tolist()):
+            if not math.isnan(yaw):
+                wp["yaw"] = yaw
+        return out
+
+    def load_list(self, wps):
+        n = min(len(wps), len(self.x))
+        for i, wp in enumerate(wps[:n]):
+            self.x[i], self.y[i] = wp["x"], wp["y"]
+            self.v[i] = wp.get("v", DEFAULT_SPEED)
+            self.yaw[i] = wp.get("yaw", np.nan)
+        self.n = n
+
+# --- モード別 waypoint ---
+waypoints_dict = {mode: WaypointArrays() for mode in DRIVING_MODES.keys()}
+
 # --- シナリオ名入力 ---
 scenario_name = input("Enter base scenario name (modes will be saved as <name>_<mode>.json): ").strip()
 base_save_path = scenario_name
@@ -92,7 +138,7 @@ for p in pylons:
 wp_lines = {}
 wp_points_plots = {}
 selected_wps = {}
-yaw_arrows = []  # 矢印オブジェクトを保持
+yaw_quiver = None  # yaw矢印（全waypoint分を1つのquiverで描画）
 
 # 各モードのプロット要素を初期化
 for mode, config in DRIVING_MODES.items():
@@ -117,35 +163,50 @@ slider = Slider(ax_slider, "Waypoint Index", 0, MAX_WAYPOINTS-1, valinit=0, vals
 ax_speed = plt.axes([0.2, 0.33, 0.65, 0.03])
 speed_slider = Slider(ax_speed, "Speed", -100.0, 100.0, valinit=DEFAULT_SPEED)
 
+# --- 補間曲線キャッシュ ---
+# スライダー操作だけでは座標が変わらないので、座標が同じなら前回の補間結果を使う
+_spline_cache = {"key": None, "out": None}
+
+def _spline_path(xs, ys):
+    key = (xs.tobytes(), ys.tobytes())
+    if _spline_cache["key"] != key:
+        # 3次スプラインは4点以上必要なので、3点のときは2次で補間
+        tck, u = splprep([xs, ys], s=0, k=min(3, len(xs) - 1))
+        unew = np.linspace(0, 1, max(100, len(xs)*10))
+        _spline_cache["out"] = splev(unew, tck)
+        _spline_cache["key"] = key
+    return _spline_cache["out"]
+
 # --- プロット更新関数 ---
 def update_plot(val=None):
-    global yaw_arrows
-    # 既存の矢印を削除
-    for arr in yaw_arrows:
-        arr.remove()
-    yaw_arrows = []
-
-    if waypoints:
-        # グリッド座標をワールド座標に変換
-        xs = [grid_to_world(wp["x"], wp["y"])[0] for wp in waypoints]  # ワールドX座標
-        ys = [grid_to_world(wp["x"], wp["y"])[1] for wp in waypoints]  # ワールドY座標
+    global yaw_quiver
+    wps = waypoints_dict[current_mode]
+    wp_line = wp_lines[current_mode]
+    wp_points = wp_points_plots[current_mode]
+    selected_wp = selected_wps[current_mode]
+    n = wps.n
+
+    # グリッド座標をワールド座標に一括変換（grid_to_worldと同じ変換）
+    xs = x_min + wps.x[:n] * resolution  # ワールドX座標
+    ys = y_min + wps.y[:n] * resolution  # ワールドY座標
+    if n:
         wp_points.set_data(xs, ys)
 
         # --- 曲線補間（purepursuit風） ---
-        if len(xs) >= 3:
-            tck, u = splprep([xs, ys], s=0)
-            unew = np.linspace(0, 1, max(100, len(xs)*10))
-            out = splev(unew, tck)
-            wp_line.set_data(out[0], out[1])
+        if n >= 3:
+            try:
+                out = _spline_path(xs, ys)
+                wp_line.set_data(out[0], out[1])
+            except (TypeError, ValueError):
+                # 同一点の連続などで補間できない場合は折れ線で表示
+                wp_line.set_data(xs, ys)
         else:
             wp_line.set_data(xs, ys)
 
         idx = int(slider.val)
-        if 0 <= idx < len(waypoints):
-            # 選択されたwaypointもワールド座標に変換
-            world_x, world_y = grid_to_world(waypoints[idx]["x"], waypoints[idx]["y"])
-            selected_wp.set_data([world_x], [world_y])
-            speed_slider.set_val(waypoints[idx]["v"])
+        if 0 <= idx < n:
+            selected_wp.set_data([xs[idx]], [ys[idx]])
+            speed_slider.set_val(float(wps.v[idx]))
         else:
             selected_wp.set_data([], [])
     else:
@@ -154,17 +215,27 @@ def update_plot(val=None):
         selected_wp.set_data([], [])
         speed_slider.set_val(DEFAULT_SPEED)
 
-    # --- yaw矢印描画（ワールド座標で） ---
+    # --- yaw矢印描画（ワールド座標で、yaw計算済みの点のみ） ---
     arrow_length = 0.4  # 40cm in world coordinates
-    for wp in waypoints:
-        if "yaw" in wp:
-            # グリッド座標をワールド座標に変換
-            world_x, world_y = grid_to_world(wp["x"], wp["y"])
-            yaw_rad = math.radians(wp["yaw"])
-            dx = arrow_length * math.cos(yaw_rad)
-            dy = arrow_length * math.sin(yaw_rad)
-            arr = ax.arrow(world_x, world_y, dx, dy, head_width=0.15, head_length=0.2, fc='r', ec='r', alpha=0.7)
-            yaw_arrows.append(arr)
+    has_yaw = ~np.isnan(wps.yaw[:n])
+    count = int(np.count_nonzero(has_yaw))
+    if count:
+        yaw_rad = np.radians(wps.yaw[:n][has_yaw])
+        offsets = np.column_stack((xs[has_yaw], ys[has_yaw]))
+        dx = arrow_length * np.cos(yaw_rad)
+        dy = arrow_length * np.sin(yaw_rad)
+        if yaw_quiver is not None and yaw_quiver.N == count:
+            # 本数が同じなら既存のquiverを更新
+            yaw_quiver.set_offsets(offsets)
+            yaw_quiver.set_UVC(dx, dy)
+        else:
+            if yaw_quiver is not None:
+                yaw_quiver.remove()
+            yaw_quiver = ax.quiver(offsets[:, 0], offsets[:, 1], dx, dy, color='r', alpha=0.7,
+                                   angles='xy', scale_units='xy', scale=1)
+    elif yaw_quiver is not None:
+        yaw_quiver.remove()
+        yaw_quiver = None
 
     fig.canvas.draw_idle()
 
@@ -188,27 +259,66 @@ def update_speed(val):
     current_waypoints = waypoints_dict[current_mode]
     idx = int(slider.val)
     if 0 <= idx < len(current_waypoints):
-        current_waypoints[idx]["v"] = speed_slider.val
+        current_waypoints.v[idx] = speed_slider.val
         print(f"{DRIVING_MODES[current_mode]['name']} - Waypoint {idx} speed set to {speed_slider.val:.2f}")
 
 speed_slider.on_changed(update_speed)
 
 MIN_TURN_RADIUS = 0.7  # [m]
 
+@njit(cache=True, fastmath=True)
 def calc_circle(x1, y1, x2, y2, x3, y3):
-    # 3点から円の中心と半径を計算
+    # 3点から円の中心と半径を計算（戻り値は常に float の (cx, cy, r)）
+    # 初回呼び出し時のみJITコンパイルで百ms程度かかる（以降はディスクキャッシュを使用）
     temp = x2**2 + y2**2
     bc = (x1**2 + y1**2 - temp) / 2.0
     cd = (temp - x3**2 - y3**2) / 2.0
     det = (x1 - x2) * (y2 - y3) - (x2 - x3) * (y1 - y2)
     if abs(det) < 1e-6:
-        return None, None, float('inf')  # 直線
+        return 0.0, 0.0, 1e308  # 直線（半径無限大扱い）
     cx = (bc*(y2 - y3) - cd*(y1 - y2)) / det
     cy = ((x1 - x2)*cd - (x2 - x3)*bc) / det
     r = math.sqrt((cx - x1)**2 + (cy - y1)**2)
     return cx, cy, r
 
 # --- マウスクリックで waypoint 追加 ---
+# パイロン中心のグリッド座標 (N,2) は起動時に一度だけ計算
+PYLONS_XY = world_to_grid_array([p["pos"] for p in pylons]).astype(np.int32).reshape(-1, 2)
+
+@njit(cache=True)
+def _pylon_hit(pylons_xy, x, y):
+    # パイロン中心から半径2以内ならTrue
+    for k in range(pylons_xy.shape[0]):
+        dx = x - pylons_xy[k, 0]
+        dy = y - pylons_xy[k, 1]
+        if dx * dx + dy * dy <= 4:
+            return True
+    return False
+
+@njit(cache=True)
+def _segment_blocked(grid, pylons_xy, x1, y1, x2, y2):
+    # 2点間の直線（Bresenham）上に障害物・壁・パイロンがあればTrue
+    dx = abs(x2 - x1)
+    dy = -abs(y2 - y1)
+    sx = 1 if x1 < x2 else -1
+    sy = 1 if y1 < y2 else -1
+    err = dx + dy
+    x, y = x1, y1
+    while True:
+        if not (0 <= y < grid.shape[0] and 0 <= x < grid.shape[1]):
+            return True  # 範囲外は障害物扱い
+        if grid[y, x] == 1 or _pylon_hit(pylons_xy, x, y):
+            return True
+        if x == x2 and y == y2:
+            return False
+        e2 = 2 * err
+        if e2 >= dy:
+            err += dy
+            x += sx
+        if e2 <= dx:
+            err += dx
+            y += sy
+
 def is_obstacle_or_wall(x, y):
     # グリッド座標が障害物や壁（値1）ならTrue
     if 0 <= y < grid_matrix.shape[0] and 0 <= x < grid_matrix.shape[1]:
@@ -216,25 +326,19 @@ def is_obstacle_or_wall(x, y):
     return True  # 範囲外は障害物扱い
 
 def is_pylon(x, y):
-    # パイロン中心から半径2以内ならTrue
-    for p in pylons:
-        px, py = world_to_grid(*p["pos"])
-        if math.hypot(x - px, y - py) <= 2:
-            return True
-    return False
+    # パイロン中心から半径2以内ならTrue（全パイロンを配列演算で一括判定）
+    return bool(np.any((PYLONS_XY[:, 0] - x) ** 2 + (PYLONS_XY[:, 1] - y) ** 2 <= 4))
 
 def is_valid_segment(x1, y1, x2, y2):
     # 2点間の直線上に障害物・壁・パイロンがないか判定
-    rr, cc = line(y1, x1, y2, x2)
-    for xi, yi in zip(cc, rr):
-        if is_obstacle_or_wall(xi, yi) or is_pylon(xi, yi):
-            return False
-    return True
+    return not _segment_blocked(grid_matrix, PYLONS_XY, x1, y1, x2, y2)
 
 def onclick(event):
     if event.inaxes != ax:
         return
-    if len(waypoints) >= MAX_WAYPOINTS:
+    wps = waypoints_dict[current_mode]
+    n = wps.n
+    if n >= MAX_WAYPOINTS:
         print(f"Maximum {MAX_WAYPOINTS} waypoints reached")
         return
     # ワールド座標からグリッド座標に変換
@@ -249,16 +353,16 @@ def onclick(event):
         print("Waypoint rejected: on pylon")
         return
     # 直前のwaypointから壁・障害物・パイロンをまたぐ場合も不可
-    if waypoints:
-        x_prev, y_prev = waypoints[-1]["x"], waypoints[-1]["y"]
+    if n:
+        x_prev, y_prev = int(wps.x[n-1]), int(wps.y[n-1])
         if not is_valid_segment(x_prev, y_prev, x_click, y_click):
             print("Waypoint rejected: crosses obstacle, wall, or pylon")
             return
 
     # 最小回転半径チェック
-    if len(waypoints) >= 2:
-        x1, y1 = waypoints[-2]["x"], waypoints[-2]["y"]
-        x2, y2 = waypoints[-1]["x"], waypoints[-1]["y"]
+    if n >= 2:
+        x1, y1 = wps.x[n-2], wps.y[n-2]
+        x2, y2 = wps.x[n-1], wps.y[n-1]
         x3, y3 = x_click, y_click
         wx1, wy1 = grid_to_world(x1, y1)
         wx2, wy2 = grid_to_world(x2, y2)
@@ -268,7 +372,7 @@ def onclick(event):
             print(f"Waypoint rejected: turn radius {radius:.2f}m < {MIN_TURN_RADIUS}m")
             return
 
-    waypoints.append({"x": x_click, "y": y_click, "v": DEFAULT_SPEED})
+    wps.append(x_click, y_click, DEFAULT_SPEED)
     update_plot()
 
 cid = fig.canvas.mpl_connect('button_press_event', onclick)
@@ -284,6 +388,14 @@ def clear(event):
     update_plot()
 button_clear.on_clicked(clear)
 
+# --- yaw 計算（次のwaypointへの方向、最終点は直前の値） ---
+def assign_yaw(wps):
+    n = wps.n
+    if n == 0:
+        return
+    wps.yaw[:n-1] = np.degrees(np.arctan2(np.diff(wps.y[:n]), np.diff(wps.x[:n])))
+    wps.yaw[n-1] = wps.yaw[n-2] if n > 1 else 0.0
+
 # --- Save ボタン (モード対応) ---
 ax_save = plt.axes([0.17, 0.1, 0.1, 0.04])
 button_save = Button(ax_save, "Save Mode")
@@ -294,19 +406,12 @@ def save_waypoints(event):
         return
 
     # yaw を計算して追加
-    for i in range(len(current_waypoints)):
-        if i < len(current_waypoints) - 1:
-            dx = current_waypoints[i+1]["x"] - current_waypoints[i]["x"]
-            dy = current_waypoints[i+1]["y"] - current_waypoints[i]["y"]
-            yaw_deg = math.degrees(math.atan2(dy, dx))
-        else:
-            yaw_deg = current_waypoints[i-1]["yaw"] if i > 0 else 0.0
-        current_waypoints[i]["yaw"] = yaw_deg
+    assign_yaw(current_waypoints)
 
     # モード別ファイル名で保存
     save_path = f"{base_save_path}{DRIVING_MODES[current_mode]['file_suffix']}.json"
     with open(save_path, "w", encoding='utf-8') as f:
-        json.dump(current_waypoints, f, indent=2, ensure_ascii=False)
+        json.dump(current_waypoints.to_list(), f, indent=2, ensure_ascii=False)
     print(f"{DRIVING_MODES[current_mode]['name']}: {len(current_waypoints)} points saved to {save_path}")
 
 button_save.on_clicked(save_waypoints)
@@ -318,7 +423,7 @@ def delete_waypoint(event):
     current_waypoints = waypoints_dict[current_mode]
     idx = int(slider.val)
     if 0 <= idx < len(current_waypoints):
-        del current_waypoints[idx]
+        current_waypoints.delete(idx)
         slider.set_val(max(0, min(slider.val, len(current_waypoints)-1)))
         update_plot()
         print(f"{DRIVING_MODES[current_mode]['name']}: Waypoint {idx} deleted")
@@ -334,19 +439,12 @@ def save_all_modes(event):
         waypoints = waypoints_dict[mode]
         if waypoints:
             # yaw 計算
-            for i in range(len(waypoints)):
-                if i < len(waypoints) - 1:
-                    dx = waypoints[i+1]["x"] - waypoints[i]["x"]
-                    dy = waypoints[i+1]["y"] - waypoints[i]["y"]
-                    yaw_deg = math.degrees(math.atan2(dy, dx))
-                else:
-                    yaw_deg = waypoints[i-1]["yaw"] if i > 0 else 0.0
-                waypoints[i]["yaw"] = yaw_deg
+            assign_yaw(waypoints)
             
             # 保存
             save_path = f"{base_save_path}{DRIVING_MODES[mode]['file_suffix']}.json"
             with open(save_path, "w", encoding='utf-8') as f:
-                json.dump(waypoints, f, indent=2, ensure_ascii=False)
+                json.dump(waypoints.to_list(), f, indent=2, ensure_ascii=False)
             total_saved += len(waypoints)
             print(f"{DRIVING_MODES[mode]['name']}: {len(waypoints)} points -> {save_path}")
     
@@ -363,11 +461,11 @@ def load_waypoints():
         file_path = f"{base_save_path}{config['file_suffix']}.json"
         try:
             with open(file_path, "r", encoding='utf-8') as f:
-                waypoints_dict[mode] = json.load(f)
+                waypoints_dict[mode].load_list(json.load(f))
             loaded_count += len(waypoints_dict[mode])
             print(f"{config['name']}: {len(waypoints_dict[mode])} points loaded from {file_path}")
         except FileNotFoundError:
-            waypoints_dict[mode] = []
+            waypoints_dict[mode].clear()
             print(f"{config['name']}: {file_path} not found, starting empty")
     
     update_plot()
@@ -2,15 +2,16 @@
 # -*- coding: utf-8 -*-
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle, Circle
+from matplotlib.collections import PatchCollection
 from matplotlib.widgets import Slider, Button, RadioButtons
-import json
+from matplotlib.transforms import Bbox
+import json_io
 import math
 import os
 from cource_map import grid_matrix, world_to_grid, grid_to_world, start_pos, goal_pos, obstacles, start_lines, pylons
 from cource_map import x_min, x_max, y_min, y_max, resolution
-from skimage.draw import line
-from scipy.interpolate import splprep, splev
 import numpy as np
+from numba_compat import njit
 
 # 文字化け完全修正 - 英語表示に変更
 plt.rcParams['font.family'] = ['DejaVu Sans']
@@ -23,17 +24,65 @@ DRIVING_MODES = {
     'final': {'name': 'Final Race', 'color': 'r', 'marker': '^', 'file_suffix': '_final'},
     'final_backup': {'name': 'Final BU', 'color': 'orange', 'marker': 'D', 'file_suffix': '_final_backup'}
 }
+# RadioButtonsの表示名 → モード
+_LABEL_TO_MODE = {config['name']: mode for mode, config in DRIVING_MODES.items()}
 
 # --- 現在のモード ---
 current_mode = 'qualifying'  # デフォルトは予選用
 
-# --- モード別 waypoint リスト ---
-waypoints_dict = {mode: [] for mode in DRIVING_MODES.keys()}
-
 # --- 最大 waypoint 数（スライダー範囲固定） ---
 MAX_WAYPOINTS = 200
 DEFAULT_SPEED = 100.0  # 初期速度を 100 に変更
 
+# --- モード別 waypoint（構造化配列、先頭 waypoints_count[mode] 個が有効） ---
+# x, y: グリッド座標, v: 速度, yaw: 方位[deg]（未計算はNaN）
+WAYPOINT_DTYPE = np.dtype([('x', 'i4'), ('y', 'i4'), ('v', 'f8'), ('yaw', 'f8')])
+waypoints_arr = {mode: np.zeros(MAX_WAYPOINTS, dtype=WAYPOINT_DTYPE) for mode in DRIVING_MODES.keys()}
+waypoints_count = {mode: 0 for mode in DRIVING_MODES.keys()}
+
+def mode_waypoints(mode):
+    """モードの有効なwaypoint（構造化配列のビュー）"""
+    return waypoints_arr[mode][:waypoints_count[mode]]
+
+def waypoints_to_records(wps):
+    """構造化配列 → JSON保存用の辞書リスト（yaw未計算の点はyawなし）"""
+    records = [{"x": x, "y": y, "v": v}
+               for x, y, v in zip(wps['x'].tolist(), wps['y'].tolist(), wps['v'].tolist())]
+    for rec, yaw in zip(records, wps['yaw'].tolist()):
+        if not math.isnan(yaw):
+            rec["yaw"] = yaw
+    return records
+
+def set_mode_waypoints(mode, records):
+    """JSONの辞書リスト → モードの構造化配列"""
+    n = min(len(records), MAX_WAYPOINTS)
+    arr = waypoints_arr[mode]
+    for i, rec in enumerate(records[:n]):
+        arr[i] = (rec["x"], rec["y"], rec.get("v", DEFAULT_SPEED), rec.get("yaw", np.nan))
+    waypoints_count[mode] = n
+
+def assign_yaw(wps):
+    """yaw = 次のwaypointへの方向（最終点は直前の値、1点のみなら0）"""
+    n = len(wps)
+    wps['yaw'][:n-1] = np.degrees(np.arctan2(np.diff(wps['y']), np.diff(wps['x'])))
+    wps['yaw'][n-1] = wps['yaw'][n-2] if n > 1 else 0.0
+
+# waypointの追加・削除・読み込みで増える版数（補間曲線キャッシュの有効判定用）
+waypoints_version = {mode: 0 for mode in DRIVING_MODES.keys()}
+spline_cache = {}  # mode -> (version, xs_out, ys_out)
+
+# 補間曲線の評価点数（画面上で見分けられない細かさは不要なので上限あり）
+SPLINE_MIN_SAMPLES = 100
+SPLINE_MAX_SAMPLES = 500
+_linspace_cache = {}
+
+def get_u(n):
+    """splevの評価パラメータ 0～1 の等間隔n点（点数ごとに使い回す）"""
+    u = _linspace_cache.get(n)
+    if u is None:
+        u = _linspace_cache[n] = np.linspace(0, 1, n)
+    return u
+
 # --- 固定ベース名（入力不要） ---
 base_save_path = "waypoints"
 
@@ -42,8 +91,13 @@ fig, ax = plt.subplots(figsize=(14, 10), dpi=100)  # より大きなプロット
 plt.subplots_adjust(bottom=0.35, left=0.12, right=0.98, top=0.95)  # スライダー用余白確保
 
 # 背景グリッド（正しいワールド座標で表示）
-ax.imshow(grid_matrix, cmap="Greys", origin="lower", 
-         extent=[x_min, x_max, y_min, y_max], alpha=0.7)
+# 0/1の地図をRGBA(uint8)に一度だけ変換して渡す（描画時のカラーマップ・正規化・alpha合成を省く）
+# 見た目は cmap="Greys", alpha=0.7 と同じ（0=白, 1=黒）
+bg_rgba = np.empty(grid_matrix.shape + (4,), dtype=np.uint8)
+bg_rgba[..., :3] = np.where(grid_matrix[..., None] == 1, 0, 255)
+bg_rgba[..., 3] = 178  # 0.7*255
+ax.imshow(bg_rgba, origin="lower", interpolation='nearest',
+         extent=[x_min, x_max, y_min, y_max])
 
 # 軸設定：正しいアスペクト比と範囲（ワールド座標）
 ax.set_aspect('equal', adjustable='box')
@@ -56,6 +110,7 @@ ax.set_ylabel(f'Y [meters] - Course Height: {y_max-y_min:.1f}m', fontsize=14, fo
 ax.set_title(f'Multi-Mode Waypoint Editor - Course: {x_max-x_min:.1f}m x {y_max-y_min:.1f}m', fontsize=16, fontweight='bold')
 
 # 障害物描画（ワールド座標）
+obstacle_patches = []
 for obs in obstacles:
     x0, y0 = obs["start"]
     x1, y1 = obs["end"]
@@ -63,8 +118,10 @@ for obs in obstacles:
     bottom = min(y0, y1)
     width = abs(x1 - x0)
     height = abs(y1 - y0)
-    rect = Rectangle((left, bottom), width, height, color="lightgreen", alpha=0.6, edgecolor='green', linewidth=2)
-    ax.add_patch(rect)
+    obstacle_patches.append(Rectangle((left, bottom), width, height))
+# 障害物・パイロンはそれぞれ1つのコレクションにまとめ、1アーティストとして描画する
+ax.add_collection(PatchCollection(obstacle_patches, facecolor="lightgreen", edgecolor='green',
+                                  alpha=0.6, linewidth=2))
 
 # スタートライン描画（ワールド座標）
 for line_def in start_lines:
@@ -73,25 +130,28 @@ for line_def in start_lines:
     ax.plot([x0, x1], [y0, y1], "b-", linewidth=4, alpha=0.8, label='Start Lines')
 
 # パイロン描画（ワールド座標）
+pylon_patches = []
 for p in pylons:
     x, y = p["pos"]
-    circ = Circle((x, y), radius=0.1, color="darkorange", alpha=0.9, edgecolor='red', linewidth=2)
-    ax.add_patch(circ)
+    pylon_patches.append(Circle((x, y), radius=0.1))
+ax.add_collection(PatchCollection(pylon_patches, facecolor="darkorange", edgecolor='red',
+                                  alpha=0.9, linewidth=2))
 
 # --- waypoint 描画 (モード別) ---
 wp_lines = {}
 wp_points_plots = {}
 selected_wps = {}
-yaw_arrows = []  # 矢印オブジェクトを保持
+yaw_quivers = {}  # mode -> yaw矢印（モードごとに1つのquiverで全waypoint分を描画）
 
-# 各モードのプロット要素を初期化
+# 各モードのプロット要素を初期化（毎回更新するのでanimatedにし、背景キャッシュに重ねて描画）
 for mode, config in DRIVING_MODES.items():
     wp_lines[mode], = ax.plot([], [], "--", lw=2, color=config['color'], 
-                             label=f"{config['name']} Path", alpha=0.8)
+                             label=f"{config['name']} Path", alpha=0.8, animated=True)
     wp_points_plots[mode], = ax.plot([], [], config['marker'], color=config['color'], 
-                                    markersize=6, alpha=0.8)
+                                    markersize=6, alpha=0.8, animated=True)
     selected_wps[mode], = ax.plot([], [], config['marker'], color='red', 
-                                 markersize=10, markeredgecolor='black', markeredgewidth=2)
+                                 markersize=10, markeredgecolor='black', markeredgewidth=2,
+                                 animated=True)
 
 # --- モード選択 RadioButtons（位置調整） ---
 ax_radio = plt.axes([0.02, 0.65, 0.11, 0.3])
@@ -107,31 +167,135 @@ slider = Slider(ax_slider, "Waypoint Index", 0, MAX_WAYPOINTS-1, valinit=0, vals
 ax_speed = plt.axes([0.2, 0.18, 0.65, 0.03])
 speed_slider = Slider(ax_speed, "Speed", -100.0, 100.0, valinit=DEFAULT_SPEED)
 
+# スライダーの値変更ごとの全体再描画を止め、スライダー部分だけを個別に描き直す
+# 数値表示(valtext)はAxesの右外にあるので、Axesとvaltextを含む領域の背景を保存して描き直す
+# 名前(label)・valtextは全体描画から外し(animated)、draw_event時に自分で描く
+for sl in (slider, speed_slider):
+    sl.drawon = False
+    sl.label.set_animated(True)
+    sl.valtext.set_animated(True)
+
+# --- 背景キャッシュ（ブリット） ---
+# コース背景（グリッド画像・障害物・パイロン・スタートライン）は全体再描画時（初回表示・リサイズ・
+# ボタン操作）にのみラスタライズして保存し、更新時はwaypoint関連の図形だけを重ねて描画する
+background = [None]
+slider_backgrounds = {}  # Slider -> (描き直す領域, 領域の背景)
+
+def slider_region(sl, renderer):
+    # スライダーのAxes + 右側のvaltext（図の右端まで）、端ではみ出すつまみ分として上下左右に余白
+    a = sl.ax.bbox
+    t = sl.valtext.get_window_extent(renderer)
+    pad = a.height / 2
+    return Bbox.from_extents(a.x0 - pad, min(a.y0, t.y0) - pad, fig.bbox.x1, max(a.y1, t.y1) + pad)
+
+def draw_dynamic_artists():
+    for mode in DRIVING_MODES:
+        ax.draw_artist(wp_lines[mode])
+        ax.draw_artist(wp_points_plots[mode])
+        ax.draw_artist(selected_wps[mode])
+    for q in yaw_quivers.values():
+        ax.draw_artist(q)
+
+def on_draw(event):
+    background[0] = fig.canvas.copy_from_bbox(ax.bbox)
+    draw_dynamic_artists()
+    for sl in (slider, speed_slider):
+        region = slider_region(sl, event.renderer)
+        slider_backgrounds[sl] = (region, fig.canvas.copy_from_bbox(region))
+        sl.ax.draw_artist(sl.label)
+        sl.ax.draw_artist(sl.valtext)
+
+fig.canvas.mpl_connect('draw_event', on_draw)
+
+def on_lim_changed(a):
+    # ズーム・パンで表示範囲が変わったら保存済み背景は使えない（次のdraw_eventで取り直す）
+    background[0] = None
+
+ax.callbacks.connect('xlim_changed', on_lim_changed)
+ax.callbacks.connect('ylim_changed', on_lim_changed)
+
+def blit_slider(sl):
+    # 保存した背景に戻してからスライダーとvaltextを描き直し、その領域だけを画面に反映
+    saved = slider_backgrounds.get(sl)
+    if saved is None:
+        return
+    region, bg = saved
+    fig.canvas.restore_region(bg)
+    fig.draw_artist(sl.ax)
+    sl.ax.draw_artist(sl.valtext)
+    fig.canvas.blit(region)
+
+def blit_update():
+    if background[0] is None:
+        fig.canvas.draw_idle()  # 初回表示前は通常の再描画
+        return
+    fig.canvas.restore_region(background[0])
+    draw_dynamic_artists()
+    fig.canvas.blit(ax.bbox)
+    blit_slider(slider)
+    blit_slider(speed_slider)
+
 # --- プロット更新関数 (モード対応) ---
+# ワールド座標の描画用バッファ（モードごとに確保し、更新のたびに上書きして使い回す）
+world_xs = {mode: np.empty(MAX_WAYPOINTS) for mode in DRIVING_MODES.keys()}
+world_ys = {mode: np.empty(MAX_WAYPOINTS) for mode in DRIVING_MODES.keys()}
+EMPTY_XY = np.empty(0)
+
+def waypoints_to_world_array(mode):
+    """waypoint配列 → ワールド座標配列 (xs, ys)（grid_to_worldの一括版、バッファのビューを返す）"""
+    wps = mode_waypoints(mode)
+    n = len(wps)
+    xs = np.multiply(wps['x'], resolution, out=world_xs[mode][:n])
+    ys = np.multiply(wps['y'], resolution, out=world_ys[mode][:n])
+    xs += x_min
+    ys += y_min
+    return xs, ys
+
+def set_yaw_quiver(mode, xs, ys, dx, dy):
+    """モードのyaw矢印を更新（quiverの本数は作成時に固定されるため、本数が変わった時のみ作り直す）"""
+    q = yaw_quivers.get(mode)
+    if q is not None and q.N == len(xs):
+        q.set_offsets(np.column_stack((xs, ys)))
+        q.set_UVC(dx, dy)
+    else:
+        if q is not None:
+            q.remove()
+        q = yaw_quivers[mode] = ax.quiver(xs, ys, dx, dy, color=DRIVING_MODES[mode]['color'],
+                                          angles='xy', scale_units='xy', scale=1,
+                                          alpha=0.7, animated=True)
+    q.set_visible(True)
+
+# 前回描画時の (選択index, モード, waypoint版数)。スライダーが同じindex内で動いただけなら再描画しない
+_last_state = {"idx": -1, "mode": None, "version": -1}
+
 def update_plot(val=None):
-    global yaw_arrows
-    # 既存の矢印を削除
-    for arr in yaw_arrows:
-        arr.remove()
-    yaw_arrows = []
+    state = (int(slider.val), current_mode, waypoints_version[current_mode])
+    if val is not None and state == (_last_state["idx"], _last_state["mode"], _last_state["version"]):
+        return
+    _last_state["idx"], _last_state["mode"], _last_state["version"] = state
+
+    # 現在のモードのwaypointをワールド座標に一括変換（以降の描画で共用）
+    current_waypoints = mode_waypoints(current_mode)
+    xs, ys = waypoints_to_world_array(current_mode)
 
     # 全モードのプロットを更新（選択モードのみ表示）
     for mode in DRIVING_MODES.keys():
-        waypoints = waypoints_dict[mode]
-        
-        if mode == current_mode and waypoints:
+        if mode == current_mode and len(current_waypoints):
             # 現在のモードのみ表示
-            # グリッド座標をワールド座標に変換
-            xs = [grid_to_world(wp["x"], wp["y"])[0] for wp in waypoints]  # ワールドX座標
-            ys = [grid_to_world(wp["x"], wp["y"])[1] for wp in waypoints]  # ワールドY座標
             wp_points_plots[mode].set_data(xs, ys)
 
-            # --- 曲線補間（purepursuit風） ---
-            if len(xs) >= 3:
+            # --- 曲線補間（purepursuit風、waypointが変わっていなければ前回の結果を使う） ---
+            cached = spline_cache.get(mode)
+            if cached is not None and cached[0] == waypoints_version[mode]:
+                wp_lines[mode].set_data(cached[1], cached[2])
+            elif len(xs) >= 3:
+                # scipyは起動を遅くするため、初めて補間が必要になった時に読み込む（2回目以降はキャッシュ済み）
+                from scipy.interpolate import splprep, splev
                 try:
                     tck, u = splprep([xs, ys], s=0)
-                    unew = np.linspace(0, 1, max(100, len(xs)*10))
+                    unew = get_u(min(SPLINE_MAX_SAMPLES, max(SPLINE_MIN_SAMPLES, len(xs)*5)))
                     out = splev(unew, tck)
+                    spline_cache[mode] = (waypoints_version[mode], out[0], out[1])
                     wp_lines[mode].set_data(out[0], out[1])
                 except:
                     wp_lines[mode].set_data(xs, ys)
@@ -139,112 +303,161 @@ def update_plot(val=None):
                 wp_lines[mode].set_data(xs, ys)
         else:
             # 現在のモード以外は非表示
-            wp_lines[mode].set_data([], [])
-            wp_points_plots[mode].set_data([], [])
+            wp_lines[mode].set_data(EMPTY_XY, EMPTY_XY)
+            wp_points_plots[mode].set_data(EMPTY_XY, EMPTY_XY)
     
     # 現在のモードの選択されたwaypointを表示
-    current_waypoints = waypoints_dict[current_mode]
     idx = int(slider.val)
     
     # 全モードの選択状態をリセット
     for mode in DRIVING_MODES.keys():
-        selected_wps[mode].set_data([], [])
+        selected_wps[mode].set_data(EMPTY_XY, EMPTY_XY)
     
+    # 速度スライダーの表示だけを合わせる（イベントを止め、update_speedで値を書き戻さない）
+    speed_slider.eventson = False
     if 0 <= idx < len(current_waypoints):
-        # 現在のモードのみ選択表示（ワールド座標に変換）
-        world_x, world_y = grid_to_world(current_waypoints[idx]["x"], current_waypoints[idx]["y"])
-        selected_wps[current_mode].set_data([world_x], [world_y])
-        speed_slider.set_val(current_waypoints[idx]["v"])
+        # 現在のモードのみ選択表示
+        selected_wps[current_mode].set_data(xs[idx:idx+1], ys[idx:idx+1])
+        speed_slider.set_val(float(current_waypoints['v'][idx]))
     else:
         speed_slider.set_val(DEFAULT_SPEED)
+    speed_slider.eventson = True
 
     # --- yaw矢印描画 (選択したモードのみ、ワールド座標) ---
     arrow_length = 0.5  # ワールド座標で50cm
-    mode_waypoints = waypoints_dict[current_mode]
-    mode_config = DRIVING_MODES[current_mode]
-    
-    for wp in mode_waypoints:
-        if "yaw" in wp:
-            # グリッド座標をワールド座標に変換
-            world_x, world_y = grid_to_world(wp["x"], wp["y"])
-            yaw_rad = math.radians(wp["yaw"])
-            dx = arrow_length * math.cos(yaw_rad)
-            dy = arrow_length * math.sin(yaw_rad)
-            arr = ax.arrow(world_x, world_y, dx, dy, head_width=0.1, head_length=0.15, 
-                          fc=mode_config['color'], ec=mode_config['color'], alpha=0.7)
-            yaw_arrows.append(arr)
-
-    fig.canvas.draw_idle()
+    for q in yaw_quivers.values():
+        q.set_visible(False)
+    yaw_idx = ~np.isnan(current_waypoints['yaw'])
+    if yaw_idx.any():
+        yaw_rad = np.radians(current_waypoints['yaw'][yaw_idx])
+        set_yaw_quiver(current_mode, xs[yaw_idx], ys[yaw_idx],
+                       arrow_length * np.cos(yaw_rad), arrow_length * np.sin(yaw_rad))
+
+    blit_update()
+
+# --- スライダーイベントの間引き ---
+# ドラッグ中は1ピクセルごとに値変更イベントが来るため、最初のイベントから interval[ms] の間に
+# 来た変更はまとめ、最後の値で1回だけ callback を呼ぶ
+def coalesced(callback, interval=16):
+    timer = fig.canvas.new_timer(interval=interval)
+    timer.single_shot = True
+    pending = {"val": None, "scheduled": False}
+
+    def fire():
+        pending["scheduled"] = False
+        callback(pending["val"])
+
+    def on_changed(val):
+        pending["val"] = val
+        if not pending["scheduled"]:
+            pending["scheduled"] = True
+            timer.start()
+
+    timer.add_callback(fire)
+    return on_changed
 
 # --- モード変更関数 ---
 def change_mode(label):
     global current_mode
     # ラベルからモードを取得
-    for mode, config in DRIVING_MODES.items():
-        if config['name'] == label:
-            current_mode = mode
-            break
+    current_mode = _LABEL_TO_MODE.get(label, current_mode)
     
     print(f"Mode changed to: {DRIVING_MODES[current_mode]['name']}")
     update_plot()
     
 mode_radio.on_clicked(change_mode)
-slider.on_changed(update_plot)
+slider.on_changed(coalesced(update_plot))
 
 # --- 速度スライダー更新 (モード対応) ---
-def update_speed(val):
-    current_waypoints = waypoints_dict[current_mode]
-    idx = int(slider.val)
+def update_speed(event):
+    # event: 値変更時点の (モード, waypoint index, 速度)。間引きで遅れて呼ばれても対象はずれない
+    mode, idx, val = event
+    current_waypoints = mode_waypoints(mode)
     if 0 <= idx < len(current_waypoints):
-        current_waypoints[idx]["v"] = speed_slider.val
-        print(f"{DRIVING_MODES[current_mode]['name']} - Waypoint {idx} speed set to {speed_slider.val:.2f}")
+        current_waypoints['v'][idx] = val
+        print(f"{DRIVING_MODES[mode]['name']} - Waypoint {idx} speed set to {val:.2f}")
+    blit_slider(speed_slider)
 
-speed_slider.on_changed(update_speed)
+_update_speed_coalesced = coalesced(update_speed)
+speed_slider.on_changed(lambda val: _update_speed_coalesced((current_mode, int(slider.val), val)))
 
 MIN_TURN_RADIUS = 0.7  # [m]
 
-def calc_circle(x1, y1, x2, y2, x3, y3):
-    # 3点から円の中心と半径を計算
+@njit(cache=True)
+def _calc_radius(x1, y1, x2, y2, x3, y3):
+    # 3点を通る円の半径（一直線上なら無限大扱いの1e308）
     temp = x2**2 + y2**2
     bc = (x1**2 + y1**2 - temp) / 2.0
     cd = (temp - x3**2 - y3**2) / 2.0
     det = (x1 - x2) * (y2 - y3) - (x2 - x3) * (y1 - y2)
     if abs(det) < 1e-6:
-        return None, None, float('inf')  # 直線
+        return 1e308  # 直線
     cx = (bc*(y2 - y3) - cd*(y1 - y2)) / det
     cy = ((x1 - x2)*cd - (x2 - x3)*bc) / det
-    r = math.sqrt((cx - x1)**2 + (cy - y1)**2)
-    return cx, cy, r
+    return math.sqrt((cx - x1)**2 + (cy - y1)**2)
 
 # --- マウスクリックで waypoint 追加 ---
-def is_obstacle_or_wall(x, y):
-    # グリッド座標が障害物や壁（値1）ならTrue
-    if 0 <= y < grid_matrix.shape[0] and 0 <= x < grid_matrix.shape[1]:
-        return grid_matrix[y, x] == 1
-    return True  # 範囲外は障害物扱い
+# 判定用の地図（int8）とパイロン中心のグリッド座標 (N,2) は起動時に一度だけ作成
+GRID_I8 = grid_matrix.astype(np.int8)
+PYLON_GRID = np.array([world_to_grid(*p["pos"]) for p in pylons], dtype=np.int32).reshape(-1, 2)
+
+@njit(cache=True)
+def _cell_blocked(grid, x, y):
+    # グリッド座標が障害物や壁（値1）、または範囲外ならTrue
+    if 0 <= y < grid.shape[0] and 0 <= x < grid.shape[1]:
+        return grid[y, x] == 1
+    return True
 
-def is_pylon(x, y):
+@njit(cache=True)
+def _near_pylon(pylon_grid, x, y):
     # パイロン中心から半径2以内ならTrue
-    for p in pylons:
-        px, py = world_to_grid(*p["pos"])
-        if math.hypot(x - px, y - py) <= 2:
+    for k in range(pylon_grid.shape[0]):
+        dx = x - pylon_grid[k, 0]
+        dy = y - pylon_grid[k, 1]
+        if dx * dx + dy * dy <= 4:
             return True
     return False
 
+@njit(cache=True)
+def bresenham_valid(x1, y1, x2, y2, grid, pylon_grid):
+    # Bresenhamで1ピクセルずつ進み、障害物・壁・パイロンに当たった時点でFalse（座標配列は作らない）
+    dx = abs(x2 - x1)
+    dy = -abs(y2 - y1)
+    sx = 1 if x1 < x2 else -1
+    sy = 1 if y1 < y2 else -1
+    err = dx + dy
+    x, y = x1, y1
+    while True:
+        if _cell_blocked(grid, x, y) or _near_pylon(pylon_grid, x, y):
+            return False
+        if x == x2 and y == y2:
+            return True
+        e2 = 2 * err
+        if e2 >= dy:
+            err += dy
+            x += sx
+        if e2 <= dx:
+            err += dx
+            y += sy
+
+def is_obstacle_or_wall(x, y):
+    return _cell_blocked(GRID_I8, x, y)
+
+def is_pylon(x, y):
+    return _near_pylon(PYLON_GRID, x, y)
+
 def is_valid_segment(x1, y1, x2, y2):
     # 2点間の直線上に障害物・壁・パイロンがないか判定
-    rr, cc = line(y1, x1, y2, x2)
-    for xi, yi in zip(cc, rr):
-        if is_obstacle_or_wall(xi, yi) or is_pylon(xi, yi):
-            return False
-    return True
+    return bresenham_valid(x1, y1, x2, y2, GRID_I8, PYLON_GRID)
 
 def onclick(event):
-    if event.inaxes != ax:
+    # 軸外のクリック、ツールバーのパン/ズーム中（widgetlock取得中）のクリックは追加しない
+    if event.inaxes != ax or fig.canvas.widgetlock.locked():
         return
     
-    current_waypoints = waypoints_dict[current_mode]
-    if len(current_waypoints) >= MAX_WAYPOINTS:
+    current_waypoints = mode_waypoints(current_mode)
+    n = len(current_waypoints)
+    if n >= MAX_WAYPOINTS:
         print(f"Maximum {MAX_WAYPOINTS} waypoints reached for {DRIVING_MODES[current_mode]['name']}")
         return
     
@@ -261,26 +474,28 @@ def onclick(event):
         return
     
     # 直前のwaypointから壁・障害物・パイロンをまたぐ場合も不可
-    if current_waypoints:
-        x_prev, y_prev = current_waypoints[-1]["x"], current_waypoints[-1]["y"]
+    if n:
+        x_prev, y_prev = int(current_waypoints['x'][-1]), int(current_waypoints['y'][-1])
         if not is_valid_segment(x_prev, y_prev, x_click, y_click):
             print("Waypoint rejected: crosses obstacle, wall, or pylon")
             return
 
     # 最小回転半径チェック
-    if len(current_waypoints) >= 2:
-        x1, y1 = current_waypoints[-2]["x"], current_waypoints[-2]["y"]
-        x2, y2 = current_waypoints[-1]["x"], current_waypoints[-1]["y"]
+    if n >= 2:
+        x1, y1 = int(current_waypoints['x'][-2]), int(current_waypoints['y'][-2])
+        x2, y2 = int(current_waypoints['x'][-1]), int(current_waypoints['y'][-1])
         x3, y3 = x_click, y_click
         wx1, wy1 = grid_to_world(x1, y1)
         wx2, wy2 = grid_to_world(x2, y2)
         wx3, wy3 = grid_to_world(x3, y3)
-        _, _, radius = calc_circle(wx1, wy1, wx2, wy2, wx3, wy3)
+        radius = _calc_radius(wx1, wy1, wx2, wy2, wx3, wy3)
         if radius < MIN_TURN_RADIUS:
             print(f"Waypoint rejected: turn radius {radius:.2f}m < {MIN_TURN_RADIUS}m")
             return
 
-    current_waypoints.append({"x": x_click, "y": y_click, "v": DEFAULT_SPEED})
+    waypoints_arr[current_mode][n] = (x_click, y_click, DEFAULT_SPEED, np.nan)
+    waypoints_count[current_mode] = n + 1
+    waypoints_version[current_mode] += 1
     print(f"Added waypoint to {DRIVING_MODES[current_mode]['name']}: ({x_click}, {y_click})")
     update_plot()
 
@@ -291,8 +506,8 @@ ax_clear = plt.axes([0.05, 0.05, 0.1, 0.04])
 button_clear = Button(ax_clear, "Clear Mode")
 
 def clear(event):
-    current_waypoints = waypoints_dict[current_mode]
-    current_waypoints.clear()
+    waypoints_count[current_mode] = 0
+    waypoints_version[current_mode] += 1
     slider.set_val(0)
     print(f"Cleared all waypoints for {DRIVING_MODES[current_mode]['name']}")
     update_plot()
@@ -303,27 +518,25 @@ button_clear.on_clicked(clear)
 ax_save = plt.axes([0.17, 0.05, 0.1, 0.04])
 button_save = Button(ax_save, "Save Mode")
 
+def _save_mode(mode):
+    """
+    モードのwaypointをyaw計算のうえモード別ファイルに保存
+    戻り値: (保存点数, 保存先パス)（waypointがなければ保存せず (0, None)）
+    """
+    waypoints = mode_waypoints(mode)
+    if not len(waypoints):
+        return 0, None
+    assign_yaw(waypoints)
+    save_path = f"{base_save_path}{DRIVING_MODES[mode]['file_suffix']}.json"
+    json_io.dump_file(save_path, waypoints_to_records(waypoints))
+    return len(waypoints), save_path
+
 def save_waypoints(event):
-    current_waypoints = waypoints_dict[current_mode]
-    if not current_waypoints:
+    count, save_path = _save_mode(current_mode)
+    if not count:
         print(f"No waypoints to save for {DRIVING_MODES[current_mode]['name']}")
         return
-
-    # yaw を計算して追加
-    for i in range(len(current_waypoints)):
-        if i < len(current_waypoints) - 1:
-            dx = current_waypoints[i+1]["x"] - current_waypoints[i]["x"]
-            dy = current_waypoints[i+1]["y"] - current_waypoints[i]["y"]
-            yaw_deg = math.degrees(math.atan2(dy, dx))
-        else:
-            yaw_deg = current_waypoints[i-1]["yaw"] if i > 0 else 0.0
-        current_waypoints[i]["yaw"] = yaw_deg
-
-    # モード別ファイル名で保存
-    save_path = f"{base_save_path}{DRIVING_MODES[current_mode]['file_suffix']}.json"
-    with open(save_path, "w", encoding='utf-8') as f:
-        json.dump(current_waypoints, f, indent=2, ensure_ascii=False)
-    print(f"{DRIVING_MODES[current_mode]['name']}: {len(current_waypoints)} points saved to {save_path}")
+    print(f"{DRIVING_MODES[current_mode]['name']}: {count} points saved to {save_path}")
 
 button_save.on_clicked(save_waypoints)
 
@@ -332,11 +545,14 @@ ax_delete = plt.axes([0.29, 0.05, 0.1, 0.04])
 button_delete = Button(ax_delete, "Delete WP")
 
 def delete_waypoint(event):
-    current_waypoints = waypoints_dict[current_mode]
+    n = waypoints_count[current_mode]
     idx = int(slider.val)
-    if 0 <= idx < len(current_waypoints):
-        del current_waypoints[idx]
-        slider.set_val(max(0, min(slider.val, len(current_waypoints)-1)))
+    if 0 <= idx < n:
+        arr = waypoints_arr[current_mode]
+        arr[idx:n-1] = arr[idx+1:n]
+        waypoints_count[current_mode] = n - 1
+        waypoints_version[current_mode] += 1
+        slider.set_val(max(0, min(slider.val, n - 2)))
         update_plot()
         print(f"{DRIVING_MODES[current_mode]['name']}: Waypoint {idx} deleted")
 
@@ -349,24 +565,10 @@ button_save_all = Button(ax_save_all, "Save All")
 def save_all_modes(event):
     total_saved = 0
     for mode in DRIVING_MODES.keys():
-        waypoints = waypoints_dict[mode]
-        if waypoints:
-            # yaw 計算
-            for i in range(len(waypoints)):
-                if i < len(waypoints) - 1:
-                    dx = waypoints[i+1]["x"] - waypoints[i]["x"]
-                    dy = waypoints[i+1]["y"] - waypoints[i]["y"]
-                    yaw_deg = math.degrees(math.atan2(dy, dx))
-                else:
-                    yaw_deg = waypoints[i-1]["yaw"] if i > 0 else 0.0
-                waypoints[i]["yaw"] = yaw_deg
-            
-            # 保存
-            save_path = f"{base_save_path}{DRIVING_MODES[mode]['file_suffix']}.json"
-            with open(save_path, "w", encoding='utf-8') as f:
-                json.dump(waypoints, f, indent=2, ensure_ascii=False)
-            total_saved += len(waypoints)
-            print(f"{DRIVING_MODES[mode]['name']}: {len(waypoints)} points -> {save_path}")
+        count, save_path = _save_mode(mode)
+        if count:
+            total_saved += count
+            print(f"{DRIVING_MODES[mode]['name']}: {count} points -> {save_path}")
     
     print(f"All modes saved! Total waypoints: {total_saved}")
 
@@ -374,20 +576,20 @@ button_save_all.on_clicked(save_all_modes)
 
 # --- Waypoints 読み込み ---
 def load_waypoints():
-    global waypoints_dict
     loaded_count = 0
     
     for mode, config in DRIVING_MODES.items():
         file_path = f"{base_save_path}{config['file_suffix']}.json"
+        waypoints_version[mode] += 1
         try:
-            with open(file_path, "r", encoding='utf-8') as f:
-                waypoints_dict[mode] = json.load(f)
-            loaded_count += len(waypoints_dict[mode])
-            print(f"{config['name']}: {len(waypoints_dict[mode])} points loaded from {file_path}")
+            set_mode_waypoints(mode, json_io.load_file(file_path))
+            loaded_count += waypoints_count[mode]
+            print(f"{config['name']}: {waypoints_count[mode]} points loaded from {file_path}")
         except FileNotFoundError:
-            waypoints_dict[mode] = []
+            waypoints_count[mode] = 0
             print(f"{config['name']}: {file_path} not found, starting empty")
     
+    # 描画更新は全モードのファイルを読み込んだ後に1回だけ
     update_plot()
     print(f"Total loaded waypoints: {loaded_count}")
 